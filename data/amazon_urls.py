@@ -0,0 +1,89 @@
+import re
+
+
+# =====================================================
+#          AMAZON MEDIA URL CANONICALIZATION
+# =====================================================
+#
+# Amazon serves one uploaded asset under many size variants:
+#
+#   https://m.media-amazon.com/images/I/71abcXYZ12L.jpg               (original)
+#   https://m.media-amazon.com/images/I/71abcXYZ12L._AC_SX679_.jpg    (679px wide)
+#   https://m.media-amazon.com/images/I/71abcXYZ12L._SS40_.jpg        (40px thumb)
+#
+# Product photos live under /images/I/ and are collapsed to their largest
+# variant. /images/G/ holds sprites, nav icons, badges and other page
+# chrome. /images/S/ also serves product content (A+ "aplus-media"
+# images), so those URLs pass through as they are; only the known
+# icon / nav / placeholder files there are dropped.
+
+AMAZON_MEDIA = re.compile(
+    r"^https?://[^/]*(?:media-amazon\.com|images-amazon\.com|ssl-images-amazon\.com)"
+    r"/images/(?P<kind>[A-Z])/(?:[^?#]*/)?(?P<name>[^/?#]+)$"
+)
+
+# size modifiers: SX679, SY500, SL1500, SS40, UX300, UY200, UL1500, SR300,300 ...
+SIZE_MODIFIER = re.compile(r"(?:S[XYLS]|U[XYLS])(\d+)|SR(\d+),(\d+)")
+
+ORIGINAL = 10 ** 9     # no modifier = the full-size upload
+
+CHROME_KINDS = {"G"}
+CHROME_NAME = re.compile(r"sprite|icon|/nav|/sash/|transparent-pixel|grey-pixel|loading", re.IGNORECASE)
+
+
+def parse_amazon_media(url):
+    """(kind, asset_id, size) for an Amazon media URL, or None for anything else."""
+    m = AMAZON_MEDIA.match(url)
+    if not m:
+        return None
+
+    name = m.group("name")
+    asset, _, rest = name.partition(".")
+    modifiers = rest.rsplit(".", 1)[0] if "." in rest else ""
+
+    sizes = [int(n) for groups in SIZE_MODIFIER.findall(modifiers) for n in groups if n]
+    size = max(sizes) if sizes else (ORIGINAL if not modifiers.strip("_") else 0)
+    return m.group("kind"), asset, size
+
+
+def canonicalize_amazon_urls(urls):
+    """
+    Collapse Amazon size variants to one URL per asset (the largest one),
+    drop non-product Amazon media (/images/G/ chrome, sprites, nav icons).
+
+    Non-Amazon URLs and other Amazon media (A+ content under /images/S/)
+    pass through, exact duplicates removed. Order follows
+    the first appearance of each asset, so the output is stable.
+    """
+    best = {}        # asset_id → (size, url)
+    order = []       # asset ids / plain urls in first-seen order
+    seen_plain = set()
+
+    for url in urls:
+        if not url:
+            continue
+        parsed = parse_amazon_media(url)
+        if parsed is None:
+            if url not in seen_plain:
+                seen_plain.add(url)
+                order.append(("url", url))
+            continue
+
+        kind, asset, size = parsed
+        if kind in CHROME_KINDS:
+            continue
+        if kind != "I":
+            # /images/S/ (A+ content ...): kept, but not size-collapsed
+            if CHROME_NAME.search(url.split("/images/", 1)[1]):
+                continue
+            if url not in seen_plain:
+                seen_plain.add(url)
+                order.append(("url", url))
+            continue
+        if asset not in best:
+            order.append(("asset", asset))
+            best[asset] = (size, url)
+        elif size > best[asset][0]:
+            best[asset] = (size, url)
+
+    return [best[key][1] if kind == "asset" else key for kind, key in order]
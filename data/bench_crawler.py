@@ -0,0 +1,508 @@
+"""
+Benchmark: the crawler end to end against a local stand-in for Amazon and
+the shop sites — no network, no live Amazon.
+
+    python bench_crawler.py [--scale 10] [--latency 0.05] [--error-rate 0.02]
+                            [--throttle 20] [--pages auto|chrome|http]
+                            [--json run.json] [--baseline previous.json]
+
+The base catalog (product_final.json, else product_final_old.json) is
+repeated SCALE times into a synthetic catalog of the same shape, with
+every image URL pointed at a server process that answers for all hosts:
+
+  www.amazon.test      Amazon-style product pages (page_fixtures): an
+                       #imgTagWrapperId gallery with data-a-dynamic-image,
+                       colorImages / imageGalleryData script blobs
+  m.media-amazon.com   their gallery images
+  shop.test            generic shop pages (the crawler's fallback scrape)
+  img.shop.test        direct image links
+
+Images come from prosmart_images. The server can add latency, 503 errors
+and per-host 429 throttling. Every product goes through json_img_crawler's
+process_product in a temporary directory; the report gives products/s,
+images/s, per-product and per-stage latency percentiles and peak RSS.
+With --baseline, exits with status 1 when images/s, product p95 or peak
+RSS got worse by more than --tolerance.
+
+Pages are rendered by headless Chrome when selenium is installed
+(hosts are mapped with --host-resolver-rules), otherwise fetched over
+plain HTTP (--pages http).
+"""
+
+import argparse
+import contextlib
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from aiohttp.abc import AbstractResolver
+
+from page_fixtures import amazon_product_page, generic_product_page
+
+IMAGE_ROOT = "prosmart_images"
+BASE_CATALOGS = ("product_final.json", "product_final_old.json")
+VALID_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+
+AMAZON_HOST = "www.amazon.test"      # "amazon." in the URL → the crawler scrapes the gallery
+MEDIA_HOST = "m.media-amazon.com"    # must match amazon_urls.AMAZON_MEDIA to be canonicalized
+SHOP_HOST = "shop.test"
+IMAGE_HOST = "img.shop.test"
+
+PAGE_KB = 2048                       # filler per Amazon page, like the real ones
+PAGE_CACHE = 256                     # rendered pages kept by the server
+TOLERANCE = 0.15
+
+
+# =====================================================
+#                 SYNTHETIC CATALOG
+# =====================================================
+
+def _is_image_url(url):
+    return os.path.splitext(urlparse(url).path)[1].lower() in VALID_EXT
+
+
+def synthetic_catalog(base, scale):
+    """`base` (product_final.json shape) with every product repeated `scale`
+    times; Amazon links, direct images and other pages keep their mix."""
+    seq = 0
+    out = {"categories": {}}
+    for cat_name, cat in base["categories"].items():
+        subs = {}
+        for sub_name, sub in cat["subcategories"].items():
+            products = []
+            for r in range(scale):
+                for prod in sub["products"]:
+                    urls = []
+                    for url in prod.get("image_urls", []):
+                        seq += 1
+                        if "amazon." in url:
+                            urls.append(f"http://{AMAZON_HOST}/dp/B{seq:09d}")
+                        elif _is_image_url(url):
+                            urls.append(f"http://{IMAGE_HOST}/p/{seq}.jpg")
+                        else:
+                            urls.append(f"http://{SHOP_HOST}/item/{seq}")
+                    products.append(dict(prod, product_id=f"{prod['product_id']}_r{r:03d}", image_urls=urls))
+            subs[sub_name] = dict(sub, products=products)
+        out["categories"][cat_name] = dict(cat, subcategories=subs)
+    return out
+
+
+def iter_products(catalog):
+    for cat_name, cat in catalog["categories"].items():
+        for sub_name, sub in cat["subcategories"].items():
+            for prod in sub["products"]:
+                yield prod, cat_name, sub_name
+
+
+# =====================================================
+#                 STAND-IN SERVER
+# =====================================================
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"     # keep-alive, like the real CDNs
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        srv = self.server
+        host = (self.headers.get("Host") or "").split(":")[0]
+
+        if srv.latency:
+            time.sleep(srv.latency * random.uniform(0.5, 1.5))
+        if srv.throttled(host):
+            return self.reply(429, b"slow down", "text/plain", {"Retry-After": "1"})
+        if srv.error_rate and random.random() < srv.error_rate:
+            return self.reply(503, b"unavailable", "text/plain")
+
+        path = self.path.split("?")[0]
+        if host == AMAZON_HOST and path.startswith("/dp/B"):
+            seed = int(path[5:])
+            return self.reply(200, srv.page("amazon", seed), "text/html; charset=utf-8")
+        if host == SHOP_HOST and path.startswith("/item/"):
+            seed = int(path[6:])
+            return self.reply(200, srv.page("shop", seed), "text/html; charset=utf-8")
+        if host == MEDIA_HOST and path.startswith("/images/I/"):
+            asset = path[10:].split(".")[0]
+            return self.reply(200, srv.image(asset), "image/jpeg")
+        if host == IMAGE_HOST:
+            return self.reply(200, srv.image(path), "image/jpeg")
+        self.reply(404, b"not found", "text/plain")
+
+    def reply(self, status, body, ctype, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass    # the crawler hung up early (probe rejection, cancel)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, images, latency=0.0, error_rate=0.0, throttle=0.0, page_kb=PAGE_KB):
+        super().__init__(addr, StandInHandler, bind_and_activate=False)
+        self.images = images
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle = throttle      # requests/sec allowed per host (0 = unlimited)
+        self.page_kb = page_kb
+        self._buckets = {}            # host → (tokens, last)
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)    # crawler hang-ups are expected
+
+    def throttled(self, host):
+        if not self.throttle:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(host, (self.throttle, now))
+            tokens = min(self.throttle, tokens + (now - last) * self.throttle)
+            if tokens < 1:
+                self._buckets[host] = (tokens, now)
+                return True
+            self._buckets[host] = (tokens - 1, now)
+            return False
+
+    def image(self, key):
+        return self.images[zlib.crc32(key.encode()) % len(self.images)]
+
+    def page(self, kind, seed):
+        with self._lock:
+            page = self._pages.get((kind, seed))
+        if page is not None:
+            return page
+        if kind == "amazon":
+            html = amazon_product_page(4 + seed % 9, self.page_kb, f"http://{MEDIA_HOST}", seed=seed)
+        else:
+            urls = [f"http://{IMAGE_HOST}/g/{seed}_{i}.jpg" for i in range(3 + seed % 6)]
+            html = generic_product_page(urls, seed=seed)
+        page = html.encode()
+        with self._lock:
+            if len(self._pages) >= PAGE_CACHE:
+                self._pages.pop(next(iter(self._pages)))
+            self._pages[(kind, seed)] = page
+        return page
+
+
+def load_images(root):
+    blobs = []
+    for dirpath, dirnames, files in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d != "variants")
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in VALID_EXT:
+                with open(os.path.join(dirpath, name), "rb") as f:
+                    blobs.append(f.read())
+    return blobs
+
+
+def serve(sock, image_root, latency, error_rate, throttle, page_kb):
+    """Server process entry point (listening socket inherited from the parent)."""
+    server = StandInServer(("127.0.0.1", 0), load_images(image_root),
+                           latency, error_rate, throttle, page_kb)
+    server.socket.close()
+    server.socket = sock
+    server.serve_forever()
+
+
+def start_server(args):
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(128)
+    proc = multiprocessing.get_context("fork").Process(
+        target=serve, daemon=True,
+        args=(sock, os.path.abspath(args.images), args.latency, args.error_rate,
+              args.throttle, args.page_kb),
+    )
+    proc.start()
+    return proc, sock.getsockname()[1]
+
+
+# =====================================================
+#          CRAWLER SIDE: EVERY HOST → THE SERVER
+# =====================================================
+
+class StaticResolver(AbstractResolver):
+    """aiohttp resolver sending every host to 127.0.0.1:port."""
+
+    def __init__(self, port):
+        self.port = port
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        return [{"hostname": host, "host": "127.0.0.1", "port": self.port,
+                 "family": socket.AF_INET, "proto": 0, "flags": socket.AI_NUMERICHOST}]
+
+    async def close(self):
+        pass
+
+
+class HttpPageWorker:
+    """ChromeWorker stand-in for machines without Chrome: plain GET, no JS."""
+
+    def __init__(self, port):
+        self.port = port
+        self.conn = None
+        self.get_seconds = 0.0
+        self.status = None
+
+    def get_page(self, url, max_wait, settle_after_load=None):
+        u = urlparse(url)
+        start = time.perf_counter()
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=max_wait)
+        try:
+            self.conn.request("GET", u.path or "/", headers={"Host": u.netloc})
+            r = self.conn.getresponse()
+            body = r.read()
+        except (OSError, http.client.HTTPException):
+            self.quit()
+            raise
+        self.status = r.status
+        self.get_seconds = time.perf_counter() - start
+        return body.decode("utf-8", "replace"), self.get_seconds, "load"
+
+    def quit(self):
+        if self.conn is not None:
+            self.conn.close()
+        self.conn = None
+
+
+def page_pool(mode, port, limiter, metrics, workers, max_wait):
+    from browser_pool import BrowserPool
+
+    if mode == "chrome":
+        return BrowserPool(workers, max_wait=max_wait, limiter=limiter, metrics=metrics,
+                           extra_args=[f"--host-resolver-rules=MAP * 127.0.0.1:{port}"])
+
+    class HttpPagePool(BrowserPool):
+        def _worker(self):
+            worker = getattr(self._local, "worker", None)
+            if worker is None:
+                worker = self._local.worker = HttpPageWorker(port)
+                with self._lock:
+                    self._all.append(worker)
+            return worker
+
+    return HttpPagePool(workers, max_wait=max_wait, limiter=limiter, metrics=metrics)
+
+
+def peak_rss_mb(pid="self"):
+    """VmHWM of a process in MB (Linux), None elsewhere."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+# =====================================================
+#                       RUN
+# =====================================================
+
+def run(args):
+    base_path = next((p for p in BASE_CATALOGS if os.path.exists(p)), None)
+    if base_path is None:
+        sys.exit(f"No base catalog found ({', '.join(BASE_CATALOGS)})")
+    with open(base_path, "r", encoding="utf-8") as f:
+        catalog = synthetic_catalog(json.load(f), args.scale)
+    jobs = list(iter_products(catalog))
+    if args.products:
+        jobs = jobs[:args.products]
+
+    mode = args.pages
+    if mode == "auto":
+        try:
+            import selenium  # noqa: F401
+            mode = "chrome"
+        except ImportError:
+            mode = "http"
+
+    server, port = start_server(args)
+    print(f"🧪 {len(jobs)} products ({base_path} x{args.scale}), pages via {mode}, "
+          f"latency {args.latency * 1000:.0f}ms, errors {args.error_rate:.0%}, "
+          f"throttle {args.throttle or 'off'}/s per host, stand-in server on :{port}")
+
+    workdir = tempfile.mkdtemp(prefix="bench_crawler_")
+    here = os.getcwd()
+    os.chdir(workdir)    # manifest, phash index, cache and images of the run land here
+    try:
+        return crawl(args, jobs, mode, port, server)
+    finally:
+        os.chdir(here)
+        server.terminate()
+        if not args.keep:
+            import shutil
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def crawl(args, jobs, mode, port, server):
+    import json_img_crawler as crawler
+    from crawl_metrics import CrawlMetrics
+
+    # the script's own session, built around the stand-in
+    session = crawler.session
+    crawler.HTTP_CACHE_DIR = None     # every run measures the network path
+    session.start(
+        page_pool=lambda limiter, metrics: page_pool(mode, port, limiter, metrics, crawler.BROWSER_WORKERS,
+                                                     crawler.PAGE_READY_TIMEOUT),
+        resolver=StaticResolver(port),
+        metrics=CrawlMetrics(),
+    )
+    browsers, downloader, pipeline = session.browsers, session.downloader, session.pipeline
+    limiter, metrics = session.limiter, session.metrics
+
+    latencies = []
+    saved_total = [0]
+    lock = threading.Lock()
+
+    def job(j):
+        start = time.perf_counter()
+        _, saved = crawler.process_product(*j)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            saved_total[0] += len(saved)
+        metrics.count("products")
+
+    metrics.total = len(jobs)
+    quiet = open(os.devnull, "w") if not args.verbose else None
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+        browsers.map(job, jobs, label=lambda j: j[0]["product_id"])
+    wall = time.perf_counter() - start
+
+    server_pid = server.pid
+    workers = [p.pid for p in multiprocessing.active_children() if p.pid != server_pid]
+    rss = {
+        "crawler_mb": peak_rss_mb(),
+        "workers_mb": max((peak_rss_mb(pid) or 0 for pid in workers), default=0) or None,
+        "workers": len(workers),
+    }
+
+    session.close()
+    if quiet:
+        quiet.close()
+
+    stages = metrics.report()["stages"]
+    return {
+        "products": len(latencies),
+        "failed": len(jobs) - len(latencies),
+        "images_saved": saved_total[0],
+        "wall_s": round(wall, 3),
+        "products_per_s": round(len(latencies) / wall, 3),
+        "images_per_s": round(saved_total[0] / wall, 3),
+        "mb_downloaded": round(downloader.stats["bytes"] / 1e6, 1),
+        "product_latency_s": {p: round(pct(latencies, q), 3)
+                              for p, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))},
+        "stages": {name: {k: s[k] for k in ("count", "mean_s", "p50_s", "p95_s", "p99_s", "max_s")}
+                   for name, s in stages.items()},
+        "rejected": dict(pipeline.stats),
+        "rate_limiter": dict(limiter.stats),
+        "peak_rss": rss,
+        "config": {"scale": args.scale, "pages": mode, "latency": args.latency,
+                   "error_rate": args.error_rate, "throttle": args.throttle,
+                   "cpu_workers": crawler.CPU_WORKERS},
+    }
+
+
+# =====================================================
+#                     REPORT
+# =====================================================
+
+def print_report(r):
+    lat = r["product_latency_s"]
+    rss = r["peak_rss"]
+    print(f"\n⚡ {r['products']} products ({r['failed']} failed), {r['images_saved']} images, "
+          f"{r['mb_downloaded']} MB in {r['wall_s']:.1f}s")
+    print(f"   {r['products_per_s']:.2f} products/s, {r['images_per_s']:.1f} images/s")
+    print(f"   per product: p50 {lat['p50']:.2f}s, p95 {lat['p95']:.2f}s, "
+          f"p99 {lat['p99']:.2f}s, max {lat['max']:.2f}s")
+    print(f"   peak RSS: crawler {rss['crawler_mb'] or 0:.0f} MB"
+          + (f", largest of {rss['workers']} image workers {rss['workers_mb']:.0f} MB" if rss["workers_mb"] else ""))
+    print(f"\n{'stage':<16}{'count':>8}{'mean':>9}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}")
+    for name, s in sorted(r["stages"].items(), key=lambda kv: -kv[1]["count"] * kv[1]["mean_s"]):
+        print(f"{name:<16}{s['count']:>8}{s['mean_s']:>9.4f}{s['p50_s']:>8}{s['p95_s']:>8}"
+              f"{s['p99_s']:>8}{s['max_s']:>8.3f}")
+    print("\n🧮 " + ", ".join(f"{n} {k}" for k, n in sorted(r["rejected"].items(), key=lambda kv: -kv[1])))
+    print("🚦 " + ", ".join(f"{round(n, 1)} {k}" for k, n in sorted(r["rate_limiter"].items())))
+
+
+def regressions(r, baseline, tolerance):
+    """Human-readable list of metrics that got worse than baseline by > tolerance."""
+    checks = [
+        ("images/s", r["images_per_s"], baseline["images_per_s"], False),
+        ("product p95", r["product_latency_s"]["p95"], baseline["product_latency_s"]["p95"], True),
+        ("crawler peak RSS", r["peak_rss"]["crawler_mb"], baseline["peak_rss"]["crawler_mb"], True),
+    ]
+    worse = []
+    for name, now, before, higher_is_worse in checks:
+        if not now or not before:
+            continue
+        change = now / before - 1
+        if (change > tolerance) if higher_is_worse else (change < -tolerance):
+            worse.append(f"{name}: {before} → {now} ({change:+.0%})")
+    return worse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end crawler benchmark.")
+    parser.add_argument("--scale", type=int, default=10, help="copies of the base catalog (10, 100, ...)")
+    parser.add_argument("--products", type=int, default=0, help="only crawl the first N products")
+    parser.add_argument("--images", default=IMAGE_ROOT, help="image tree the server draws from")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean server latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--throttle", type=float, default=0.0, help="per-host requests/sec before 429s (0 = off)")
+    parser.add_argument("--page-kb", type=int, default=PAGE_KB, help="filler per Amazon page")
+    parser.add_argument("--pages", choices=("auto", "chrome", "http"), default="auto")
+    parser.add_argument("--json", help="write the report here")
+    parser.add_argument("--baseline", help="earlier --json report to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--keep", action="store_true", help="keep the temporary crawl directory")
+    parser.add_argument("--verbose", action="store_true", help="show the crawler's own output")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📁 Report saved to: {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            worse = regressions(report, json.load(f), args.tolerance)
+        if worse:
+            print("❌ Regression vs " + args.baseline + ":\n   " + "\n   ".join(worse))
+            sys.exit(1)
+        print(f"✅ Within {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
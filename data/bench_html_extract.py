@@ -0,0 +1,145 @@
+"""
+Benchmark: full BeautifulSoup tree vs targeted html_extract scanning.
+
+    python bench_html_extract.py [SAVED_PAGES_DIR]
+
+Runs the Amazon gallery extraction (main image + dynamic-image JSON,
+colorImages / imageGalleryData blobs, every <img> attribute) over saved
+*.html pages, or over generated Amazon-style fixtures when no directory is
+given. Reports parse time and peak Python heap, and checks both
+versions find the same URLs.
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+from urllib.parse import urljoin
+
+from html_extract import gallery_json_urls, iter_img_attrs, main_gallery_img
+from page_fixtures import amazon_product_page
+
+BASE_URL = "https://www.amazon.in/dp/B000000000"
+RUNS = 5
+
+
+def _normalize(urls, base_url):
+    out = set()
+    for u in urls:
+        u0 = u.split("?")[0]
+        if u0.startswith("//"):
+            u0 = "https:" + u0
+        if u0.startswith("/"):
+            u0 = urljoin(base_url, u0)
+        out.add(u0)
+    return out
+
+
+def legacy_extract(page_source, base_url):
+    """extract_amazon_image_urls as it was, on a BeautifulSoup tree."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page_source, "html.parser")
+    urls = set()
+
+    tag = soup.select_one("#imgTagWrapperId img")
+    if tag:
+        dynamic = tag.get("data-a-dynamic-image")
+        if dynamic:
+            try:
+                urls.update(json.loads(dynamic).keys())
+            except ValueError:
+                pass
+        if tag.get("src"):
+            urls.add(tag["src"])
+
+    for script in soup.find_all("script"):
+        txt = script.string
+        if txt and ("colorImages" in txt or "imageGalleryData" in txt):
+            urls.update(
+                v for v in txt.split('"')
+                if v.lower().startswith("http") and v.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))
+            )
+
+    for img in soup.find_all("img"):
+        for attr in ("data-old-hires", "data-src", "src"):
+            u = img.get(attr)
+            if u and isinstance(u, str):
+                urls.add(u)
+
+    return _normalize(urls, base_url)
+
+
+def fast_extract(page_source, base_url):
+    """The same extraction through html_extract."""
+    urls = []
+
+    tag = main_gallery_img(page_source)
+    if tag:
+        dynamic = tag.get("data-a-dynamic-image")
+        if dynamic:
+            try:
+                urls.extend(json.loads(dynamic).keys())
+            except ValueError:
+                pass
+        if tag.get("src"):
+            urls.append(tag["src"])
+
+    urls.extend(gallery_json_urls(page_source))
+
+    for img in iter_img_attrs(page_source):
+        for attr in ("data-old-hires", "data-src", "src"):
+            if img.get(attr):
+                urls.append(img[attr])
+
+    return _normalize(urls, base_url)
+
+
+def load_pages(directory):
+    if directory:
+        pages = []
+        for name in sorted(os.listdir(directory)):
+            if name.endswith((".html", ".htm")):
+                with open(os.path.join(directory, name), "r", encoding="utf-8", errors="replace") as f:
+                    pages.append((name, f.read()))
+        return pages
+
+    return [
+        (f"fixture_{kb // 1024}MB", amazon_product_page(n_images=14, filler_kb=kb, seed=kb))
+        for kb in (1024, 3072, 6144)
+    ]
+
+
+def measure(fn, page):
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        result = fn(page, BASE_URL)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(page, BASE_URL)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak, result
+
+
+def main():
+    pages = load_pages(sys.argv[1] if len(sys.argv) > 1 else None)
+    if not pages:
+        print("No pages found")
+        return
+
+    print(f"{'page':<16}{'size MB':>9}{'bs4 ms':>10}{'fast ms':>10}{'speedup':>9}"
+          f"{'bs4 peak MB':>13}{'fast peak MB':>14}{'urls':>7}{'same':>6}")
+    for name, page in pages:
+        slow_t, slow_mem, slow_urls = measure(legacy_extract, page)
+        fast_t, fast_mem, fast_urls = measure(fast_extract, page)
+        print(f"{name:<16}{len(page) / 1e6:>9.1f}{slow_t * 1000:>10.1f}{fast_t * 1000:>10.1f}"
+              f"{slow_t / fast_t:>8.1f}x{slow_mem / 1e6:>13.1f}{fast_mem / 1e6:>14.2f}"
+              f"{len(fast_urls):>7}{str(slow_urls == fast_urls):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Micro-benchmark: pure-Python bright-pixel loop vs the NumPy validity check.
+
+    python bench_image_filter.py [IMAGE_ROOT]
+
+Runs both versions over every image under prosmart_images (already decoded,
+so only the filter itself is timed) and checks they agree.
+"""
+
+import os
+import sys
+import time
+
+from PIL import Image
+
+from image_processing import is_valid_image
+
+IMAGE_ROOT = "prosmart_images"
+VALID_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+
+MIN_WIDTH = 200
+MIN_HEIGHT = 200
+MIN_NON_WHITE_RATIO = 0.20
+
+
+def legacy_is_valid_image(img: Image.Image):
+    """The original per-pixel loop from json_img_crawler.py."""
+    w, h = img.size
+    if w < MIN_WIDTH or h < MIN_HEIGHT:
+        return False
+
+    gray = img.convert("L")
+    bright_pixels = sum(1 for px in gray.getdata() if px > 245)
+    total = w * h
+
+    if (total - bright_pixels) / total < MIN_NON_WHITE_RATIO:
+        return False
+
+    return True
+
+
+def load_images(root):
+    images = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() not in VALID_EXT:
+                continue
+            img = Image.open(os.path.join(dirpath, filename))
+            img.load()
+            images.append(img)
+    return images
+
+
+def timed(fn, images):
+    start = time.perf_counter()
+    results = [fn(img) for img in images]
+    return time.perf_counter() - start, results
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else IMAGE_ROOT
+    images = load_images(root)
+    if not images:
+        print("No images found under", root)
+        return
+
+    megapixels = sum(img.size[0] * img.size[1] for img in images) / 1e6
+    print(f"📦 {len(images)} images, {megapixels:.1f} MP total\n")
+
+    legacy_t, legacy = timed(legacy_is_valid_image, images)
+    rows = [("legacy python loop", legacy_t, legacy)]
+
+    for label, fast in (("numpy", False), ("numpy fast path", True)):
+        t, res = timed(
+            lambda img: is_valid_image(img, MIN_WIDTH, MIN_HEIGHT, MIN_NON_WHITE_RATIO, fast=fast),
+            images,
+        )
+        rows.append((label, t, res))
+
+    print(f"{'variant':<20}{'total s':>10}{'ms/img':>10}{'speedup':>10}{'mismatch':>10}")
+    for label, t, res in rows:
+        mismatches = sum(a != b for a, b in zip(res, legacy))
+        print(f"{label:<20}{t:>10.3f}{t / len(images) * 1000:>10.2f}"
+              f"{legacy_t / t:>9.1f}x{mismatches:>10}")
+
+
+if __name__ == "__main__":
+    main()
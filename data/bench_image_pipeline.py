@@ -0,0 +1,90 @@
+"""
+Benchmark: per-image CPU time of the old decode-three-times path vs
+DecodedImage (decode once, validate → hash → save).
+
+    python bench_image_pipeline.py [IMAGE_ROOT]
+
+Reads the raw bytes of every image under prosmart_images, pushes them
+through both paths (writing JPEGs to a temp dir) and reports CPU ms/img.
+It also checks that both paths produce the same phash for every image.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import imagehash
+from PIL import Image
+
+from image_processing import DecodedImage, is_valid_image
+
+IMAGE_ROOT = "prosmart_images"
+VALID_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+
+MIN_WIDTH = 200
+MIN_HEIGHT = 200
+MIN_NON_WHITE_RATIO = 0.20
+
+
+def legacy_path(content, out_path):
+    """validate, hash and save exactly like the crawlers used to: 3 decodes."""
+    img = Image.open(BytesIO(content))
+    if not is_valid_image(img, MIN_WIDTH, MIN_HEIGHT, MIN_NON_WHITE_RATIO):
+        return None
+    gray = Image.open(BytesIO(content)).convert("L").resize((256, 256))
+    h = str(imagehash.phash(gray))
+    Image.open(BytesIO(content)).convert("RGB").save(out_path, format="JPEG", quality=90)
+    return h
+
+
+def decode_once_path(content, out_path):
+    img = DecodedImage(content)
+    if not img.is_valid(MIN_WIDTH, MIN_HEIGHT, MIN_NON_WHITE_RATIO):
+        img.release()
+        return None
+    h = img.phash()
+    img.save_jpeg(out_path, quality=90)
+    return h
+
+
+def load_bytes(root):
+    blobs = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in VALID_EXT:
+                with open(os.path.join(dirpath, filename), "rb") as f:
+                    blobs.append(f.read())
+    return blobs
+
+
+def run(fn, blobs, out_dir):
+    start = time.process_time()
+    hashes = [fn(content, os.path.join(out_dir, f"{i}.jpg")) for i, content in enumerate(blobs)]
+    return time.process_time() - start, hashes
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else IMAGE_ROOT
+    blobs = load_bytes(root)
+    if not blobs:
+        print("No images found under", root)
+        return
+
+    print(f"📦 {len(blobs)} images, {sum(map(len, blobs)) / 1e6:.1f} MB encoded\n")
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        legacy_t, legacy_h = run(legacy_path, blobs, out_dir)
+        once_t, once_h = run(decode_once_path, blobs, out_dir)
+
+    mismatches = sum(a != b for a, b in zip(legacy_h, once_h))
+    n = len(blobs)
+    print(f"{'variant':<16}{'cpu s':>10}{'cpu ms/img':>12}")
+    print(f"{'decode x3':<16}{legacy_t:>10.2f}{legacy_t / n * 1000:>12.2f}")
+    print(f"{'decode once':<16}{once_t:>10.2f}{once_t / n * 1000:>12.2f}")
+    print(f"\n⚡ {legacy_t / once_t:.2f}x less CPU per image, phash mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
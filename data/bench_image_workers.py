@@ -0,0 +1,93 @@
+"""
+Benchmark: decode / validate / phash / JPEG encode throughput of the
+image worker processes at 1, 2, 4 and 8 workers.
+
+    python bench_image_workers.py [IMAGE_ROOT]
+
+Loads the raw bytes of every image under prosmart_images, then pushes the
+whole set through:
+  - in-process      the pipeline's thread path (one thread, GIL-bound)
+  - shm             ImageProcessPool, bytes passed through shared memory
+  - pickled         the same pool, bytes pickled through the pool's pipes
+and reports images/sec plus the CPU time the calling (crawler) process
+spends per image, i.e. what is left under its GIL. Every run must give
+the same phashes and JPEG bytes as the in-process path.
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from image_processing import DecodedImage, QualityCheck, rejection
+from image_workers import ImageProcessPool, _process_bytes
+
+IMAGE_ROOT = "prosmart_images"
+VALID_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+WORKER_COUNTS = (1, 2, 4, 8)
+ROUNDS = 3           # the image set is processed this many times per run
+
+CHECK = QualityCheck(200, 200, 0.20)
+
+
+def load_images(root):
+    blobs = []
+    for dirpath, _, files in os.walk(root):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in VALID_EXT:
+                with open(os.path.join(dirpath, name), "rb") as f:
+                    blobs.append(f.read())
+    return blobs
+
+
+def in_process(content):
+    img = DecodedImage(content)
+    reason = rejection(CHECK, img)
+    if reason is not None:
+        img.release()
+        return reason, None, None
+    h = img.phash()
+    out = BytesIO()
+    img.save_jpeg(out, quality=90)
+    return None, h, out.getvalue()
+
+
+def timed(fn, blobs, threads=1):
+    """(images/sec, parent CPU ms per image, results of the first round)"""
+    start, cpu = time.perf_counter(), time.process_time()
+    with ThreadPoolExecutor(threads) as ex:
+        results = list(ex.map(fn, blobs * ROUNDS))
+    cpu_ms = (time.process_time() - cpu) * 1000 / len(results)
+    return len(results) / (time.perf_counter() - start), cpu_ms, results[:len(blobs)]
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else IMAGE_ROOT
+    blobs = load_images(root)
+    if not blobs:
+        print("No images found under", root)
+        return
+    print(f"{len(blobs)} images, {sum(map(len, blobs)) / 1e6:.1f} MB, "
+          f"{os.cpu_count()} CPUs, x{ROUNDS} rounds\n")
+
+    base_rate, cpu_ms, expected = timed(in_process, blobs)
+    print(f"{'mode':<14}{'workers':>8}{'img/s':>10}{'speedup':>9}{'parent ms/img':>15}{'same':>6}")
+    print(f"{'in-process':<14}{1:>8}{base_rate:>10.1f}{1.0:>8.2f}x{cpu_ms:>15.2f}{'':>6}")
+
+    for workers in WORKER_COUNTS:
+        pool = ImageProcessPool(workers)
+        try:
+            for mode, fn in (
+                ("shm", lambda c: pool.process(c, CHECK)[:3]),
+                ("pickled", lambda c: pool.pool.apply(_process_bytes, (c, CHECK, 90))[:3]),
+            ):
+                rate, cpu_ms, got = timed(fn, blobs, pool.concurrency)
+                print(f"{mode:<14}{workers:>8}{rate:>10.1f}{rate / base_rate:>8.2f}x"
+                      f"{cpu_ms:>15.2f}{str(got == expected):>6}")
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: cloudinary_upload's concurrent uploader against a simulated
+remote (storage_backends.SimulatedBackend) — no account, no network.
+
+    python bench_upload.py [--workers 1,2,4,8,16,32] [--latency 0.25]
+                           [--failure-rate 0.02] [--rate-limit 20]
+                           [--upload-rate 10] [--variants] [--root prosmart_images]
+
+Every original under --root (plus every file under its variants folders
+with --variants) is pushed through upload_many() once per worker count,
+exactly as a --full run would upload it: same retry loop, same
+client-side RateLimiter, same per-file timing. The remote sleeps --latency per call,
+fails --failure-rate of them with a 500 and answers 429 above
+--rate-limit calls/sec. Reports files/s, speedup over the first worker
+count, retries, failures, the remote's 429 count and upload p50/p95, so
+UPLOAD_WORKERS / UPLOAD_RATE can be chosen for a given API limit.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import time
+
+import cloudinary_upload as uploader
+from crawl_metrics import CrawlMetrics
+from rate_limiter import RateLimiter
+from storage_backends import SIM_FAILURE_RATE, SIM_LATENCY, SIM_RATE_LIMIT, SimulatedBackend
+
+IMAGE_ROOT = "prosmart_images"
+WORKER_COUNTS = "1,2,4,8,16,32"
+
+
+def variant_files(root):
+    """[(rel_path, local_path)] of every file in the variants folders under root."""
+    files = []
+    for dirpath, _, filenames in os.walk(root):
+        if uploader.VARIANT_DIR in os.path.relpath(dirpath, root).split(os.sep):
+            for name in sorted(filenames):
+                local_path = os.path.join(dirpath, name)
+                files.append((os.path.relpath(local_path, root).replace(os.sep, "/"), local_path))
+    return files
+
+
+def run(files, workers, args):
+    """One upload of `files` on `workers` threads against a fresh simulated remote."""
+    remote = SimulatedBackend(args.latency, failure_rate=args.failure_rate,
+                              rate_limit=args.rate_limit, seed=0)
+    uploader.use_backend(remote)
+    uploader.UPLOAD_WORKERS = workers
+    uploader.limiter = RateLimiter(args.upload_rate, max_rate=args.upload_rate)
+    uploader.metrics = CrawlMetrics()
+    uploader.uploaded_files.clear()
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):     # per-file lines
+        urls = uploader.upload_many(files)
+    elapsed = time.perf_counter() - start
+    return elapsed, urls, remote, uploader.limiter, uploader.metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the concurrent uploader.")
+    parser.add_argument("--root", default=IMAGE_ROOT)
+    parser.add_argument("--workers", default=WORKER_COUNTS, help="comma-separated worker counts")
+    parser.add_argument("--latency", type=float, default=SIM_LATENCY, help="remote seconds per call")
+    parser.add_argument("--failure-rate", type=float, default=SIM_FAILURE_RATE)
+    parser.add_argument("--rate-limit", type=float, default=SIM_RATE_LIMIT,
+                        help="remote calls/sec before 429s (0 = unlimited)")
+    parser.add_argument("--upload-rate", type=float, default=uploader.UPLOAD_RATE,
+                        help="client-side pacing, as UPLOAD_RATE")
+    parser.add_argument("--variants", action="store_true",
+                        help="also upload the image_variants files (about 6x more, smaller files)")
+    args = parser.parse_args()
+
+    files = uploader.image_files(args.root)
+    if args.variants:
+        files += variant_files(args.root)
+    if not files:
+        print("No images found under", args.root)
+        return
+
+    print(f"{len(files)} files; remote {args.latency * 1000:.0f} ms/call, "
+          f"{args.failure_rate:.0%} 500s, "
+          + (f"429 above {args.rate_limit:g}/s; " if args.rate_limit else "no rate limit; ")
+          + f"client paced at {args.upload_rate:g}/s\n")
+    print(f"{'workers':>8}{'files/s':>10}{'speedup':>9}{'ok':>6}{'retries':>9}{'gave up':>9}"
+          f"{'429s':>6}{'p50 s':>8}{'p95 s':>8}")
+
+    first = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        elapsed, urls, remote, limiter, metrics = run(files, workers, args)
+        rate = len(urls) / elapsed
+        first = first or rate
+        hist = metrics.histograms.get("upload")
+        p50, p95 = (hist.quantile(0.5), hist.quantile(0.95)) if hist else (0, 0)
+        print(f"{workers:>8}{rate:>10.1f}{rate / first:>8.2f}x{len(urls):>6}{limiter.stats['retries']:>9}"
+              f"{limiter.stats['gave_up']:>9}{remote.stats['throttled']:>6}{p50:>8}{p95:>8}")
+
+
+if __name__ == "__main__":
+    main()
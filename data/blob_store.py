@@ -0,0 +1,236 @@
+"""
+Content-addressed image store.
+
+Every distinct image body is kept once under
+prosmart_store/blobs/<sha[:2]>/<sha256><ext>. The product tree keeps its
+prod_XXXX/prod_XXXX_imgN.jpg paths, but each of them is a hard link to
+its blob, so a photo shared by several products (and its variants) takes
+disk space once. store.json maps every product image to its blob:
+
+    {"<product folder>": {"prod_0007_img1.jpg": "<sha256>", ...}, ...}
+
+The crawlers, phash_index, image_variants and cloudinary_upload keep
+reading plain paths. cloudinary_upload uploads one file per inode, so
+upload volume follows the unique images too.
+
+Migrate an existing tree (idempotent) and report the savings:
+
+    python blob_store.py [--root prosmart_images] [--store prosmart_store]
+    python blob_store.py --report        # savings only, nothing changed
+"""
+
+import argparse
+import json
+import os
+
+from crawl_manifest import file_sha256
+from image_variants import VARIANT_DIR
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+IMAGE_ROOT = "prosmart_images"
+STORE_ROOT = "prosmart_store"        # must be on the same filesystem as IMAGE_ROOT (hard links)
+STORE_MANIFEST = "store.json"        # inside STORE_ROOT
+VALID_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def iter_files(root):
+    """Every image under root, variants included, in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in VALID_EXT:
+                yield os.path.join(dirpath, filename)
+
+
+# =====================================================
+#                   BLOB STORE
+# =====================================================
+
+class BlobStore:
+    """
+    Hard-link based dedup store for one image tree.
+
+    `add(path)` moves a file's body into the store (or, if an identical
+    body is already there, swaps the file for a link to it). Files in the
+    tree are only ever replaced atomically, never rewritten in place:
+    writers must write a temp file and os.replace() it (crawl_pipeline and
+    image_variants do), otherwise every product sharing the blob changes.
+    """
+
+    def __init__(self, root=STORE_ROOT, image_root=IMAGE_ROOT):
+        self.root = root
+        self.image_root = image_root
+        self.manifest_path = os.path.join(root, STORE_MANIFEST)
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def blob_path(self, sha, ext):
+        return os.path.join(self.root, "blobs", sha[:2], sha + ext.lower())
+
+    def add(self, path):
+        """Link `path` into the store; returns (sha256, bytes freed)."""
+        sha = file_sha256(path)
+        blob = self.blob_path(sha, os.path.splitext(path)[1])
+        try:
+            if os.path.samefile(path, blob):
+                return sha, 0                # already linked
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            try:
+                os.link(path, blob)          # first copy becomes the blob
+            except OSError:
+                pass                         # no hard links here: a copy would share nothing
+            return sha, 0
+
+        size = os.path.getsize(path)
+        tmp = path + ".link"
+        try:
+            os.link(blob, tmp)
+        except OSError:
+            return sha, 0                    # store on another filesystem: nothing to share
+        os.replace(tmp, path)                # the duplicate body is dropped
+        return sha, size
+
+    def _linked(self, path, sha):
+        if not sha:
+            return False
+        try:
+            return os.path.samefile(path, self.blob_path(sha, os.path.splitext(path)[1]))
+        except OSError:
+            return False
+
+    def ingest(self, folders=None):
+        """
+        Add every image under `folders` (default: the whole image tree) and
+        refresh their manifest entries. Returns (files, bytes freed).
+        """
+        folders = sorted(set(folders)) if folders is not None else [self.image_root]
+        files = freed = 0
+        for folder in folders:
+            for path in iter_files(folder):
+                files += 1
+                key = os.path.relpath(os.path.dirname(path), self.image_root).replace(os.sep, "/")
+                name = os.path.basename(path)
+                if self._linked(path, self.manifest.get(key, {}).get(name)):
+                    continue                 # unchanged since the last ingest: skip the hashing
+                sha, saved = self.add(path)
+                freed += saved
+                if VARIANT_DIR not in key.split("/"):     # originals only; variants are linked all the same
+                    self.manifest.setdefault(key, {})[name] = sha
+            self._prune(folder)
+        self.save()
+        return files, freed
+
+    def _prune(self, folder):
+        """Forget manifest entries whose file under `folder` is gone."""
+        prefix = os.path.relpath(folder, self.image_root).replace(os.sep, "/")
+        for key in list(self.manifest):
+            if prefix != "." and key != prefix and not key.startswith(prefix + "/"):
+                continue
+            names = self.manifest[key]
+            for name in list(names):
+                if not os.path.exists(os.path.join(self.image_root, key, name)):
+                    del names[name]
+            if not names:
+                del self.manifest[key]
+
+    def gc(self):
+        """
+        Delete blobs no file in the tree links to any more; returns bytes
+        freed. Every blob is a hard link (add() never stores copies), so a
+        link count of 1 means only the store still holds it.
+        """
+        freed = 0
+        for path in iter_files(os.path.join(self.root, "blobs")):
+            st = os.stat(path)
+            if st.st_nlink == 1:
+                os.remove(path)
+                freed += st.st_size
+        return freed
+
+    def save(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(self.manifest.items())), f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+
+# =====================================================
+#                   SAVINGS REPORT
+# =====================================================
+
+def disk_usage(root):
+    """(image files, bytes as seen per path, bytes actually on disk)."""
+    files = logical = physical = 0
+    seen = set()
+    for path in iter_files(root):
+        st = os.stat(path)
+        files += 1
+        logical += st.st_size
+        if (st.st_dev, st.st_ino) not in seen:
+            seen.add((st.st_dev, st.st_ino))
+            physical += st.st_size
+    return files, logical, physical
+
+
+def duplicate_bytes(root):
+    """(redundant files, bytes) that separate copies of identical bodies take."""
+    inodes, bodies = set(), set()
+    files = size = 0
+    for path in iter_files(root):
+        st = os.stat(path)
+        if (st.st_dev, st.st_ino) in inodes:
+            continue                     # already a link, costs nothing
+        inodes.add((st.st_dev, st.st_ino))
+        sha = file_sha256(path)
+        if sha in bodies:
+            files += 1
+            size += st.st_size
+        bodies.add(sha)
+    return files, size
+
+
+def usage_report(root):
+    files, logical, physical = disk_usage(root)
+    if not logical:
+        return None
+    return (f"{files} image files, {logical / 1e6:.1f} MB referenced, {physical / 1e6:.1f} MB on disk "
+            f"(-{100 * (1 - physical / logical):.1f}%)")
+
+
+# =====================================================
+#                       CLI
+# =====================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Move an image tree into the content-addressed store.")
+    parser.add_argument("--root", default=IMAGE_ROOT)
+    parser.add_argument("--store", default=STORE_ROOT)
+    parser.add_argument("--report", action="store_true", help="only report, change nothing")
+    args = parser.parse_args()
+
+    if args.report:
+        dupes, size = duplicate_bytes(args.root)
+        print(f"📦 {usage_report(args.root)}")
+        print(f"♻ {dupes} files are separate copies of another image: {size / 1e6:.2f} MB to free")
+        return
+
+    print(f"📦 before: {usage_report(args.root)}")
+    store = BlobStore(args.store, args.root)
+    files, freed = store.ingest()
+    freed += store.gc()
+    print(f"🔗 {files} files linked into {args.store}, {freed / 1e6:.2f} MB freed")
+    print(f"📦 after:  {usage_report(args.root)}")
+    print(f"📁 Manifest saved to: {store.manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from crawl_metrics import NULL_METRICS
+from rate_limiter import RETRY_STATUSES, URL_DEADLINE, RateLimiter, backoff
+
+# selenium / webdriver_manager are imported lazily: runs that never open a
+# page (direct .jpg links, small TARGET_IDS batches) should not pay for them.
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+BROWSER_WORKERS = 4          # headless Chrome instances running in parallel
+RESTART_AFTER_PAGES = 50     # recycle a browser after this many page loads
+PAGE_RETRIES = 2             # reloads per page after a browser crash or a 429/503, with backoff
+MAP_WINDOW = 2               # map() keeps at most this many items per worker queued
+
+# resolved chromedriver binary, reused across runs instead of asking
+# webdriver_manager (network + version probing) every time
+DRIVER_CACHE_FILE = ".chromedriver_path.json"
+
+CHROME_ARGS = [
+    "--headless=new",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--blink-settings=imagesEnabled=false",
+]
+
+# "eager" → driver.get returns at DOMContentLoaded; readiness is then polled
+PAGE_LOAD_STRATEGY = "eager"
+PAGE_READY_TIMEOUT = 8.0     # upper bound on waiting for a page to become usable
+SETTLE_AFTER_LOAD = 0.3      # pages without gallery/og:image: wait this long after load
+READY_POLL_INTERVAL = 0.05
+
+# images are fetched by the downloader and styling is never looked at, so
+# the browser does not need to pull any of these
+BLOCKED_RESOURCES = [
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.css", "*.woff", "*.woff2", "*.ttf", "*.otf",
+]
+CHROME_PREFS = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.managed_default_content_settings.fonts": 2,
+    "profile.managed_default_content_settings.stylesheets": 2,
+}
+
+# evaluated in the page: which readiness signal (if any) is present yet
+READY_SCRIPT = """
+if (document.querySelector('#imgTagWrapperId img[data-a-dynamic-image]')) return 'gallery';
+if (document.querySelector('meta[property="og:image"]')) return 'og:image';
+if (document.readyState === 'complete') return 'load';
+return null;
+"""
+
+# HTTP status of the loaded document (Chrome 109+; 0 when unknown)
+STATUS_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0];
+return nav ? nav.responseStatus : 0;
+"""
+
+
+# =====================================================
+#             DRIVER BINARY RESOLUTION
+# =====================================================
+
+_driver_lock = threading.Lock()
+
+
+def resolve_driver_path(refresh=False):
+    """
+    Return the chromedriver path, using the on-disk cache when it still
+    points at an existing binary. `refresh=True` forces a fresh resolution.
+    """
+    with _driver_lock:
+        if not refresh:
+            try:
+                with open(DRIVER_CACHE_FILE, "r", encoding="utf-8") as f:
+                    path = json.load(f).get("path")
+                if path and os.path.exists(path):
+                    return path
+            except (OSError, ValueError):
+                pass
+
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        path = ChromeDriverManager().install()
+        try:
+            with open(DRIVER_CACHE_FILE, "w", encoding="utf-8") as f:
+                json.dump({"path": path, "resolved_at": time.time()}, f)
+        except OSError:
+            pass
+        return path
+
+
+# =====================================================
+#                 SINGLE WORKER
+# =====================================================
+
+class ChromeWorker:
+    """
+    One headless Chrome owned by exactly one pool thread.
+    The browser is started on first use, recycled after `restart_after`
+    page loads and thrown away (then restarted) if it crashes.
+    """
+
+    def __init__(self, chrome_args, restart_after):
+        self.chrome_args = chrome_args
+        self.restart_after = restart_after
+        self.driver = None
+        self.pages = 0
+        self.get_seconds = 0.0      # driver.get part of the last page load
+        self.status = None          # HTTP status of the last page load, None if unknown
+
+    def start(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+
+        opts = Options()
+        for arg in self.chrome_args:
+            opts.add_argument(arg)
+        opts.page_load_strategy = PAGE_LOAD_STRATEGY
+        opts.add_experimental_option("prefs", CHROME_PREFS)
+
+        try:
+            self.driver = webdriver.Chrome(service=Service(resolve_driver_path()), options=opts)
+        except Exception:
+            # cached driver no longer matches the installed Chrome → re-resolve once
+            path = resolve_driver_path(refresh=True)
+            self.driver = webdriver.Chrome(service=Service(path), options=opts)
+        self.pages = 0
+
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_RESOURCES})
+        except Exception:
+            pass    # prefs above still keep images off
+
+    def quit(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+        self.driver = None
+
+    def wait_ready(self, start, max_wait, settle_after_load):
+        """
+        Poll until the gallery <img> or og:image meta shows up (or the page
+        finished loading `settle_after_load` seconds ago). Returns the
+        signal that ended the wait, "timeout" after `max_wait` seconds.
+        """
+        loaded_at = None
+        while True:
+            state = self.driver.execute_script(READY_SCRIPT)
+            now = time.perf_counter()
+            if state in ("gallery", "og:image"):
+                return state
+            if state == "load":
+                loaded_at = loaded_at or now
+                if now - loaded_at >= settle_after_load:
+                    return state
+            if now - start >= max_wait:
+                return "timeout"
+            time.sleep(READY_POLL_INTERVAL)
+
+    def get_page(self, url, max_wait, settle_after_load=SETTLE_AFTER_LOAD):
+        """
+        Load `url` once and return (rendered HTML, seconds taken, ready signal).
+        A browser that dies or hangs is thrown away (the next call starts a
+        new one) and the error re-raised: BrowserPool decides about retries.
+        """
+        from selenium.common.exceptions import WebDriverException
+
+        if self.driver is None:
+            self.start()
+        try:
+            start = time.perf_counter()
+            self.driver.get(url)
+            self.get_seconds = time.perf_counter() - start
+            self.status = self.driver.execute_script(STATUS_SCRIPT) or None
+            if self.status in RETRY_STATUSES:
+                signal = "error"        # nothing worth waiting for
+            else:
+                signal = self.wait_ready(start, max_wait, settle_after_load)
+            page = self.driver.page_source
+            elapsed = time.perf_counter() - start
+        except WebDriverException:
+            self.quit()
+            raise
+
+        self.pages += 1
+        if self.pages >= self.restart_after:
+            self.quit()
+        return page, elapsed, signal
+
+
+# =====================================================
+#                   BROWSER POOL
+# =====================================================
+
+class BrowserPool:
+    """
+    N headless Chrome workers, one per thread. Nothing is started until a
+    thread first calls `get_page`.
+
+    `map(fn, items)` runs `fn(item)` on the pool threads; inside `fn`,
+    `get_page(url)` always talks to the calling thread's own browser, so a
+    product is handled start to finish by a single worker.
+    """
+
+    def __init__(self, workers=BROWSER_WORKERS, restart_after=RESTART_AFTER_PAGES,
+                 extra_args=(), cache=None, max_wait=PAGE_READY_TIMEOUT, limiter=None,
+                 metrics=NULL_METRICS, max_retries=PAGE_RETRIES):
+        self.workers = workers
+        self.cache = cache          # optional http_cache.HttpCache for rendered HTML
+        self.limiter = limiter or RateLimiter()   # share with the AsyncDownloader
+        self.metrics = metrics      # page_load / driver_get / ready_wait timings (crawl_metrics)
+        self.restart_after = restart_after
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.chrome_args = CHROME_ARGS + list(extra_args)
+
+        self.latencies = []         # seconds per live page load
+        self.signals = Counter()    # gallery / og:image / load / timeout
+
+        self._local = threading.local()
+        self._executor = None       # map() threads, kept so their browsers survive between calls
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _worker(self):
+        worker = getattr(self._local, "worker", None)
+        if worker is None:
+            worker = ChromeWorker(self.chrome_args, self.restart_after)
+            self._local.worker = worker
+            with self._lock:
+                self._all.append(worker)
+        return worker
+
+    def get_page(self, url, max_wait=None):
+        """Rendered HTML of `url`, from the cache or a browser load."""
+        if self.cache is not None:
+            page = self.cache.read_text(url)
+            if page is not None:
+                self.metrics.count("page_cache_hits")
+                return page
+            if self.cache.offline:
+                raise LookupError(f"not cached (cache-only mode): {url}")
+
+        page, elapsed, signal = self._load(url, max_wait or self.max_wait)
+        print(f"  ⏱ page ready in {elapsed:.2f}s ({signal})")
+        with self._lock:
+            self.latencies.append(elapsed)
+            self.signals[signal] += 1
+
+        if self.cache is not None:
+            self.cache.store_text(url, page)
+        return page
+
+    def _load(self, url, max_wait):
+        """
+        Rate-limited browser load, retried with backoff after a browser crash
+        or a retryable status, at most `max_retries` times and within URL_DEADLINE.
+
+        Only the page's HTTP status and the driver.get time reach the limiter:
+        a crashed browser or a slow readiness wait says nothing about the host.
+        """
+        limiter = self.limiter
+        deadline = time.monotonic() + URL_DEADLINE
+        attempt = 0
+        while True:
+            with self.metrics.time("page_rate_wait"):
+                ready = limiter.wait(url, deadline - time.monotonic())
+            if not ready:
+                limiter.count("gave_up")
+                raise TimeoutError(f"host too throttled to load within {URL_DEADLINE:.0f}s: {url}")
+            worker = self._worker()
+            try:
+                page, elapsed, signal = worker.get_page(url, max_wait)
+                error = None
+            except Exception as e:
+                error = e
+            else:
+                limiter.record(url, worker.status or 200, worker.get_seconds)
+                if worker.status in RETRY_STATUSES:
+                    error = OSError(f"HTTP {worker.status}: {url}")
+
+            if error is None:
+                metrics = self.metrics
+                metrics.observe("page_load", elapsed)
+                metrics.observe("driver_get", worker.get_seconds)
+                metrics.observe("ready_wait", elapsed - worker.get_seconds)
+                return page, elapsed, signal
+
+            attempt += 1
+            delay = backoff(attempt)
+            if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                limiter.count("gave_up")
+                raise error
+            limiter.count("retries")
+            time.sleep(delay)
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on a pool thread (and its browser); returns a Future."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            pool = self._executor
+        return pool.submit(fn, *args)
+
+    def map(self, fn, items, label=str):
+        """
+        Run fn(item) for every item across the pool; errors are reported, not
+        raised. The same threads (and browsers) serve every call, so a caller
+        may feed work in chunks.
+
+        At most MAP_WINDOW x workers items are queued at a time. On Ctrl-C
+        (or any error escaping here) nothing more is started: queued items
+        are cancelled and only the ones already running finish.
+        """
+        items = iter(items)
+        window = MAP_WINDOW * self.workers
+        futures = {}
+        try:
+            while True:
+                for item in islice(items, window - len(futures)):
+                    futures[self.submit(fn, item)] = item
+                if not futures:
+                    return
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    item = futures.pop(fut)
+                    try:
+                        fut.result()
+                    except Exception as e:
+                        print(f"!! Error processing {label(item)}: {e}")
+        except BaseException:
+            self.cancel()
+            raise
+
+    def cancel(self):
+        """Drop every queued call; calls already running finish (close() waits for them)."""
+        with self._lock:
+            pool = self._executor
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def latency_report(self):
+        """One-line summary of live page loads, or None if there were none."""
+        with self._lock:
+            times = sorted(self.latencies)
+            signals = dict(self.signals)
+        if not times:
+            return None
+
+        def pct(p):
+            return times[min(len(times) - 1, int(p * len(times)))]
+
+        ready = ", ".join(f"{n} {k}" for k, n in sorted(signals.items()))
+        return (f"{len(times)} pages, mean {sum(times) / len(times):.2f}s, "
+                f"p50 {pct(0.5):.2f}s, p95 {pct(0.95):.2f}s, max {times[-1]:.2f}s ({ready})")
+
+    def close(self):
+        with self._lock:
+            pool, self._executor = self._executor, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+        with self._lock:
+            for worker in self._all:
+                worker.quit()
+            self._all.clear()
@@ -1,8 +1,22 @@
 import os
 import json
-import cloudinary
-import cloudinary.uploader
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from types import SimpleNamespace
+
+from crawl_manifest import file_sha256
+from crawl_metrics import CrawlMetrics
+from image_variants import VARIANT_DIR, VARIANTS_MANIFEST, image_index, load_manifest
+from rate_limiter import RateLimiter, backoff
+from storage_backends import BACKENDS, PermanentError, make_backend
+from upload_journal import UploadJournal, apply, compact, replay
+
+try:
+    import cloudinary
+except ImportError:  # only the "cloudinary" storage backend needs the SDK
+    cloudinary = SimpleNamespace(config=lambda **settings: None)
 
 # =====================================================
 #                CLOUDINARY CONFIGURATION
@@ -23,67 +37,388 @@ ROOT_FOLDER = "prosmart_images"
 VALID_EXT = {".jpg", ".jpeg", ".png", ".webp"}  # allowed formats
 
 OUTPUT_JSON = "cloudinary_uploaded_urls.json"
+OUTPUT_VARIANTS_JSON = "cloudinary_variant_urls.json"  # image_variants.json with Cloudinary URLs
+STATE_FILE = "cloudinary_sync_state.json"  # public_id → content hash + secure_url of what is uploaded
+JOURNAL_FILE = "cloudinary_upload_journal.jsonl"  # every upload as it lands; folded into STATE_FILE
+
+STORAGE_BACKEND = "cloudinary"  # or "local" (static dir for a CDN) / "simulated" (offline benchmarks)
+
+UPLOAD_WORKERS = 8      # files uploaded in parallel (1 = one at a time)
+UPLOAD_RATE = 10.0      # max uploads/sec started against the API; halved on 420/429/5xx
+UPLOAD_RETRIES = 4      # extra attempts per file on transient failures (jittered backoff)
+API_HOST = "https://api.cloudinary.com"  # rate limiter key: one bucket for the whole account
 
 uploaded_data = {}  # store results
+uploaded_urls = {}  # relative path → secure_url, originals and variants
+uploaded_files = {}  # (device, inode) → secure_url: hard links (blob_store.py) are uploaded once
+sync_state = {}  # public_id → {"sha256", "url"[, "via": public_id whose upload it reuses]}
+journal = None  # UploadJournal while the script runs: sync_state changes survive a crash
+backend = None  # storage_backends instance, STORAGE_BACKEND unless use_backend() picked another
+
+limiter = RateLimiter(UPLOAD_RATE, max_rate=UPLOAD_RATE)
+metrics = CrawlMetrics()  # "upload" timings per file, retries / failures
 
 
 # =====================================================
 #     FUNCTION: Upload single file to Cloudinary
 # =====================================================
 
+def use_backend(new_backend):
+    """Send uploads to a storage_backends instance instead of STORAGE_BACKEND."""
+    global backend
+    backend = new_backend
+    return backend
+
+
+def current_backend():
+    return backend if backend is not None else use_backend(make_backend(STORAGE_BACKEND))
+
+
 def upload_single_file(local_path: str, cloud_path: str):
     """
-    Upload a single image to Cloudinary keeping the folder structure.
+    Upload a single image to the storage backend (Cloudinary by default)
+    keeping the folder structure. Rate limited (UPLOAD_RATE) and retried
+    with jittered backoff on rate limiting, 5xx and network errors.
     """
-    try:
-        result = cloudinary.uploader.upload(
-            local_path,
-            public_id=cloud_path.replace("\\", "/"),   # Windows fix
-            overwrite=True,
-            resource_type="image"
-        )
-        return result.get("secure_url")
-    except Exception as e:
-        print(f"❌ Error uploading {local_path}: {e}")
-        return None
+    store = current_backend()
+    attempt = 0
+    while True:
+        if store.rate_limited:
+            limiter.wait(API_HOST)
+        start = time.monotonic()
+        try:
+            url = store.upload(local_path, cloud_path.replace("\\", "/"))   # Windows fix
+            if store.rate_limited:
+                # status only: upload time grows with the file size, so it says
+                # nothing about the API slowing down (SLOW_LATENCY is for downloads)
+                limiter.record(API_HOST, 200, 0.0)
+            metrics.observe("upload", time.monotonic() - start)
+            return url
+        except PermanentError as e:
+            print(f"❌ Error uploading {local_path}: {e}")
+            metrics.count("upload_failed")
+            return None
+        except Exception as e:
+            # 420/429 slow the whole account down, a network error too
+            if store.rate_limited:
+                limiter.record(API_HOST, getattr(e, "status", None), 0.0)
+            attempt += 1
+            if attempt > UPLOAD_RETRIES:
+                print(f"❌ Error uploading {local_path} (gave up after {attempt} attempts): {e}")
+                limiter.count("gave_up")
+                metrics.count("upload_failed")
+                return None
+            limiter.count("retries")
+            time.sleep(backoff(attempt))
 
 
 # =====================================================
-#        FUNCTION: Traverse + Upload recursively
+#     FUNCTION: Upload many files in parallel
+# =====================================================
+
+def upload_many(files, on_upload=None):
+    """
+    Upload [(rel_path, local_path)] on UPLOAD_WORKERS threads; returns
+    {rel_path: secure_url} for the ones that succeeded.
+
+    Files that are the same inode (blob_store hard links) are uploaded
+    once, whether in this call or earlier in the run, and share the URL.
+    `on_upload(rel_path, url)` is called from the worker thread as soon as
+    each upload succeeds.
+    """
+    owner = {}        # inode → rel path uploading it
+    jobs, aliases = [], []
+    for rel_path, local_path in files:
+        st = os.stat(local_path)
+        key = (st.st_dev, st.st_ino)
+        if key in uploaded_files or key in owner:
+            aliases.append((rel_path, key))
+            continue
+        owner[key] = rel_path
+        jobs.append((rel_path, local_path, key))
+
+    def upload(job):
+        rel_path, local_path, key = job
+        start = time.monotonic()
+        url = upload_single_file(local_path, public_id(rel_path))
+        if url and on_upload is not None:
+            on_upload(rel_path, url)
+        if url:
+            print(f"⬆ Uploaded: {rel_path} ({time.monotonic() - start:.2f}s)")
+        return url
+
+    with ThreadPoolExecutor(max(1, UPLOAD_WORKERS)) as ex:
+        results = list(ex.map(upload, jobs))
+
+    urls = {}
+    for (rel_path, _, key), url in zip(jobs, results):
+        if url:
+            uploaded_files[key] = url
+            urls[rel_path] = url
+    metrics.count("uploaded", len(urls))
+    for rel_path, key in aliases:
+        if key in uploaded_files:
+            print(f"🔗 Same image as an earlier upload, reusing its URL: {rel_path}")
+            urls[rel_path] = uploaded_files[key]
+            metrics.count("reused")
+    return urls
+
+
 # =====================================================
+#     FUNCTION: Incremental sync against the state file
+# =====================================================
+
+def public_id(rel_path: str):
+    return rel_path.rsplit(".", 1)[0]  # path without extension
+
+
+def load_state(path: str = STATE_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def recover_state(path: str = STATE_FILE, journal_path: str = JOURNAL_FILE):
+    """
+    The state file with the journal of an interrupted run folded in, i.e.
+    every upload that finished before the crash. Saved back compacted.
+    """
+    state = load_state(path)
+    n = 0
+    for record in replay(journal_path):
+        apply(state, record)
+        n += 1
+    if n:
+        print(f"♻ Resuming: {n} uploads recovered from {journal_path}")
+        save_state(state, path)
+    return state
+
+
+def save_state(state: dict, path: str = STATE_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(dict(sorted(state.items())), f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())    # on disk before the journal is emptied
+    os.replace(tmp, path)
+
 
-def upload_folder(root_dir: str):
+def remember(pid: str, entry: dict):
+    sync_state[pid] = entry
+    if journal is not None:
+        journal.append({"public_id": pid, **entry})
+
+
+def forget(pid: str):
+    sync_state.pop(pid, None)
+    if journal is not None:
+        journal.append({"public_id": pid, "deleted": True})
+
+
+def sync_files(files, full=False):
     """
-    Walks through prosmart_images folder and uploads every image to Cloudinary
-    preserving folder structure.
+    Bring [(rel_path, local_path)] up to date on Cloudinary; returns
+    {rel_path: secure_url} for every file, uploaded this run or not.
+
+    A file whose content hash matches sync_state is not uploaded again.
+    A new file with the same content as an unchanged upload reuses that
+    upload's URL ("via"); such an alias is re-uploaded on its own as soon
+    as the file it points to changes or disappears. `full=True`
+    re-uploads everything, as the script always did before.
     """
-    print(f"\n🚀 Starting upload from: {root_dir}\n")
+    local = []
+    for rel_path, local_path in files:
+        local.append((rel_path, local_path, public_id(rel_path), file_sha256(local_path)))
 
+    # self-uploaded files whose remote copy still matches: safe to point at
+    owners = {}
+    for _, _, pid, sha in local:
+        entry = sync_state.get(pid)
+        if not full and entry and not entry.get("via") and entry["sha256"] == sha:
+            owners.setdefault(sha, pid)
+    valid = set(owners.values())
+
+    urls, todo, waiting = {}, {}, []
+    unchanged = 0
+    for rel_path, local_path, pid, sha in local:
+        entry = sync_state.get(pid)
+        if entry and entry["sha256"] == sha and (pid in valid or entry.get("via") in valid):
+            urls[rel_path] = entry["url"]
+            unchanged += 1
+        elif sha in owners:
+            urls[rel_path] = sync_state[owners[sha]]["url"]
+            remember(pid, {"sha256": sha, "url": urls[rel_path], "via": owners[sha]})
+            metrics.count("reused")
+        elif sha in todo:
+            waiting.append((rel_path, pid, sha))           # same content as a file uploaded below
+        else:
+            todo[sha] = (rel_path, local_path, pid)
+
+    shas = {rel_path: sha for sha, (rel_path, _, _) in todo.items()}
+    uploaded = upload_many(
+        [(rel_path, local_path) for rel_path, local_path, _ in todo.values()],
+        on_upload=lambda rel_path, url: remember(public_id(rel_path), {"sha256": shas[rel_path], "url": url}),
+    )
+    urls.update(uploaded)
+    for rel_path, pid, sha in waiting:
+        owner = todo[sha][2]
+        if owner in sync_state and sync_state[owner]["sha256"] == sha:
+            urls[rel_path] = sync_state[owner]["url"]
+            remember(pid, {"sha256": sha, "url": urls[rel_path], "via": owner})
+            metrics.count("reused")
+
+    print(f"🔁 {unchanged} unchanged, {len(uploaded)} uploaded, "
+          f"{len(urls) - unchanged - len(uploaded)} reused an identical upload, "
+          f"{len(files) - len(urls)} failed")
+    return urls
+
+
+def delete_single_file(public_id: str):
+    """Remove one asset from the storage backend (rate limited, one attempt)."""
+    store = current_backend()
+    if store.rate_limited:
+        limiter.wait(API_HOST)
+    start = time.monotonic()
+    try:
+        store.delete(public_id)
+        if store.rate_limited:
+            limiter.record(API_HOST, 200, time.monotonic() - start)
+        print(f"🗑 Deleted: {public_id}")
+        return True
+    except Exception as e:
+        if store.rate_limited:
+            limiter.record(API_HOST, getattr(e, "status", None), time.monotonic() - start)
+        print(f"❌ Error deleting {public_id}: {e}")
+        return False
+
+
+def local_public_ids(root_dir: str):
+    """public_id of every image file under root_dir, variants included."""
+    ids = set()
     for dirpath, _, filenames in os.walk(root_dir):
         for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in VALID_EXT:
+                rel_path = os.path.relpath(os.path.join(dirpath, filename), root_dir)
+                ids.add(public_id(rel_path.replace("\\", "/")))
+    return ids
+
+
+def prune_remote(local_ids, delete=False):
+    """
+    Entries of sync_state whose local file is gone. With `delete=True` their
+    remote assets are destroyed and the entries dropped; otherwise they are
+    kept (and reported) so a later --delete run can still find them.
+    """
+    stale = sorted(pid for pid in sync_state if pid not in local_ids)
+    if not stale:
+        return 0
+    if not delete:
+        print(f"ℹ {len(stale)} uploaded assets no longer exist locally (run with --delete to remove them)")
+        return 0
+
+    aliases = [pid for pid in stale if sync_state[pid].get("via")]   # nothing of their own remotely
+    owned = [pid for pid in stale if not sync_state[pid].get("via")]
+    def delete(pid):
+        ok = delete_single_file(pid)
+        if ok:
+            forget(pid)
+        return ok
+
+    with ThreadPoolExecutor(max(1, UPLOAD_WORKERS)) as ex:
+        deleted = sum(ex.map(delete, owned))
+    for pid in aliases:
+        forget(pid)
+    return deleted
+
+
+# =====================================================
+#        FUNCTION: Traverse + Upload recursively
+# =====================================================
+
+def image_files(root_dir: str):
+    """[(rel_path, local_path)] of every original image under root_dir."""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames[:] = sorted(d for d in dirnames if d != VARIANT_DIR)  # uploaded by upload_variants
+        for filename in sorted(filenames):
             ext = os.path.splitext(filename)[1].lower()
             if ext not in VALID_EXT:
                 continue  # skip non-image files
 
             local_path = os.path.join(dirpath, filename)
+            # Cloudinary folder structure, e.g.: Medical_Devices/Diagnostic_Tools/prod_0007/prod_0007_img1.jpg
+            rel_path = os.path.relpath(local_path, root_dir).replace("\\", "/")
+            files.append((rel_path, local_path))
+    return files
+
+
+def group_by_product(urls):
+    """{rel_path: url} → {prod_xxxx: [urls sorted by image index]}"""
+    data = {}
+    for rel_path in sorted(urls, key=lambda p: (Path(p).parts[-2], image_index(p), p)):
+        product_id = Path(rel_path).parts[-2]  # folder name is prod_xxxx
+        data.setdefault(product_id, []).append(urls[rel_path])
+    return data
+
+
+def upload_folder(root_dir: str, full: bool = False):
+    """
+    Walks through prosmart_images folder and uploads every new or changed
+    image to Cloudinary preserving folder structure, UPLOAD_WORKERS files
+    at a time. uploaded_data gets the URLs of every image either way.
+    """
+    files = image_files(root_dir)
+    print(f"\n🚀 Starting {'upload' if full else 'sync'} of {len(files)} files from: {root_dir} "
+          f"({UPLOAD_WORKERS} workers, ≤ {UPLOAD_RATE:g}/s)\n")
+    start = time.monotonic()
+
+    urls = sync_files(files, full)
+    uploaded_urls.update(urls)
+    uploaded_data.update(group_by_product(urls))
 
-            # Generate Cloudinary folder structure:
-            rel_path = os.path.relpath(local_path, root_dir)  # e.g.: Medical_Devices/Diagnostic_Tools/prod_0007/prod_0007_img1.jpg
-            public_id = rel_path.rsplit(".", 1)[0]            # remove extension
+    elapsed = time.monotonic() - start
+    print(f"\n🎉 Upload completed! {len(urls)}/{len(files)} files in {elapsed:.1f}s "
+          f"({len(urls) / elapsed if elapsed else 0:.1f} files/s)")
 
-            print(f"⬆ Uploading: {rel_path}")
 
-            url = upload_single_file(local_path, public_id)
+# =====================================================
+#     FUNCTION: Upload responsive variants
+# =====================================================
+
+def upload_variants(root_dir: str, manifest_path: str = VARIANTS_MANIFEST, full: bool = False):
+    """
+    Uploads every new or changed variant listed in the image_variants
+    manifest and returns the manifest with local URLs replaced by
+    Cloudinary ones (srcset-ready).
+    """
+    manifest = load_manifest(manifest_path)
+    if not manifest:
+        print(f"ℹ No variants manifest ({manifest_path}), skipping variants")
+        return {}
 
-            if url:
-                product_id = Path(rel_path).parts[-2]  # folder name is prod_xxxx
-                
-                if product_id not in uploaded_data:
-                    uploaded_data[product_id] = []
+    # relative to root_dir, e.g.: .../prod_0007/variants/webp/prod_0007_img1_w400.webp
+    rel_paths = sorted({v["url"] for entries in manifest.values() for entry in entries
+                        for variants in entry["variants"].values() for v in variants})
+    missing = [p for p in rel_paths if not os.path.exists(os.path.join(root_dir, p))]
+    if missing:
+        print(f"⚠ {len(missing)} variants in {manifest_path} no longer exist, skipped "
+              f"(rebuild with: python image_variants.py)")
+        gone = set(missing)
+        rel_paths = [p for p in rel_paths if p not in gone]
+    print(f"\n🖼 Syncing {len(rel_paths)} variants of {len(manifest)} products\n")
+    urls = sync_files([(rel_path, os.path.join(root_dir, rel_path)) for rel_path in rel_paths], full)
+    uploaded_urls.update(urls)
 
-                uploaded_data[product_id].append(url)
+    for entries in manifest.values():
+        for entry in entries:
+            entry["url"] = uploaded_urls.get(entry["url"], entry["url"])
+            for variants in entry["variants"].values():
+                for v in variants:
+                    v["url"] = urls.get(v["url"], v["url"])
 
-    print("\n🎉 Upload completed!")
+    return manifest
 
 
 # =====================================================
@@ -91,10 +426,49 @@ def upload_folder(root_dir: str):
 # =====================================================
 
 if __name__ == "__main__":
-    upload_folder(ROOT_FOLDER)
+    parser = argparse.ArgumentParser(description="Upload the image tree to Cloudinary (or another storage backend).")
+    parser.add_argument("--full", action="store_true", help="re-upload every file, ignoring the sync state")
+    parser.add_argument("--delete", action="store_true",
+                        help="delete remote assets whose local file is gone")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=STORAGE_BACKEND,
+                        help="where the images go (see storage_backends.py)")
+    args = parser.parse_args()
+
+    use_backend(make_backend(args.backend))
+    if args.backend != "cloudinary":
+        # separate state and URL files, so a trial run never mixes with the Cloudinary ones
+        OUTPUT_JSON, OUTPUT_VARIANTS_JSON, STATE_FILE, JOURNAL_FILE = (
+            f"{args.backend}_{name}" for name in (OUTPUT_JSON, OUTPUT_VARIANTS_JSON, STATE_FILE, JOURNAL_FILE)
+        )
+
+    sync_state.update(recover_state(STATE_FILE, JOURNAL_FILE))
+    journal = UploadJournal(JOURNAL_FILE)
+    journal.truncate()    # everything in it is in STATE_FILE now
+    try:
+        upload_folder(ROOT_FOLDER, args.full)
+
+        # Save output mapping
+        with open(OUTPUT_JSON, "w") as f:
+            json.dump(uploaded_data, f, indent=4)
+
+        print(f"\n📁 All uploaded URLs saved to: {OUTPUT_JSON}\n")
+
+        variant_urls = upload_variants(ROOT_FOLDER, full=args.full)
+        if variant_urls:
+            with open(OUTPUT_VARIANTS_JSON, "w") as f:
+                json.dump(variant_urls, f, indent=4)
+            print(f"📁 Variant URLs saved to: {OUTPUT_VARIANTS_JSON} "
+                  f"(python image_variants.py --no-build --manifest {OUTPUT_VARIANTS_JSON} --attach claudinary_product.json)\n")
 
-    # Save output mapping
-    with open(OUTPUT_JSON, "w") as f:
-        json.dump(uploaded_data, f, indent=4)
+        deleted = prune_remote(local_public_ids(ROOT_FOLDER), args.delete)
+        if deleted:
+            print(f"🗑 {deleted} remote assets deleted")
+    finally:
+        # compaction: the journal's records become the new state file
+        compact(journal, lambda: save_state(sync_state, STATE_FILE))
+        journal.close()
+        print(f"📁 Sync state saved to: {STATE_FILE}")
 
-    print(f"\n📁 All uploaded URLs saved to: {OUTPUT_JSON}\n")
+    print(f"🚦 {limiter.report()}")
+    if metrics.histograms:
+        print(f"⏱ uploads: {metrics.summary()}")
@@ -1,18 +1,17 @@
 import os
-import time
+import csv
+import sys
 import json
-import requests
-import pandas as pd
-from io import BytesIO
+import time
+import threading
+from collections import deque
+from itertools import islice
 from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
-from PIL import Image, ImageStat
-import imagehash
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from amazon_urls import canonicalize_amazon_urls
+from crawl_session import CrawlSession
+from html_extract import gallery_json_urls, iter_img_attrs, main_gallery_img, og_image
+from image_processing import QualityCheck
 
 # -------------------------
 # CONFIG
@@ -30,20 +29,39 @@ MIN_WIDTH = 200  # minimum width to accept
 MIN_HEIGHT = 200
 MAX_IMAGES_PER_PRODUCT = 15
 MIN_NON_WHITE_RATIO = 0.20  # at least 20% pixels non-white / non-background
+FAST_VALIDITY_CHECK = False  # sample very large images instead of counting every pixel
+CPU_WORKERS = max(0, (os.cpu_count() or 1) - 1)  # decode/phash/encode processes (0 = in-process threads)
+NEAR_DUP_DISTANCE = 4       # phash bits; closer images of one product count as duplicates
+PHASH_INDEX_FILE = os.path.join(OUTPUT_ROOT, "phash_index.json")
+VARIANT_WIDTHS = ()      # e.g. (200, 400, 800, 1600): WebP + JPEG sizes under each product folder (() = off)
+VARIANTS_MANIFEST = os.path.join(OUTPUT_ROOT, "image_variants.json")
+BLOB_STORE = None   # e.g. "images_store": identical images hard-linked to one copy (None = off)
+DOWNLOAD_CONCURRENCY = 32   # parallel image downloads across all hosts
+DOWNLOAD_PER_HOST = 8       # parallel image downloads per host
+MAX_DOWNLOAD_MB = 15        # abort any single download bigger than this
+MAX_IMAGE_MEGAPIXELS = 40   # abort any download whose header declares more pixels (decode bombs)
+SPOOL_OVER_MB = 1           # bodies bigger than this stream to a temp file instead of memory
+ROW_WORKERS = 4             # rows processed in parallel, one Chrome each
+LOOKAHEAD_ROWS = 200        # rows read from the sheet but not finished yet, at most (bounds memory)
+REPORT_ROWS = 200           # "📄 rows done" line every this many rows
+RESUME_FILE = os.path.join(OUTPUT_ROOT, "ingest_offset.txt")  # first row not yet done
+RESTART_AFTER_PAGES = 50    # recycle Chrome after this many page loads
+PAGE_READY_TIMEOUT = 8      # max seconds to wait for the gallery / og:image to appear
+HOST_RATE = 8               # starting requests/sec per host; adapts to 429/503/latency
+
+METRICS_FILE = os.path.join(OUTPUT_ROOT, "crawl_metrics.json")  # written after each run (None = off)
+PROGRESS_EVERY = 0          # seconds between "📈 progress / ETA" lines (0 = off)
+
+HTTP_CACHE_DIR = ".http_cache"   # image bytes + page HTML reused across runs (None = off)
+HTTP_CACHE_MAX_MB = 2048         # least-recently-used entries are evicted beyond this
+CACHE_ONLY = False               # replay purely from the cache, never touch the network
 
 
 # -------------------------
 # SELENIUM SETUP
 # -------------------------
-chrome_opts = Options()
-chrome_opts.add_argument("--headless=new")
-chrome_opts.add_argument("--disable-gpu")
-chrome_opts.add_argument("--no-sandbox")
-chrome_opts.add_argument("--disable-dev-shm-usage")
-chrome_opts.add_argument("--lang=en-US")
-
-service = Service(ChromeDriverManager().install())
-driver = webdriver.Chrome(service=service, options=chrome_opts)
+# browsers, downloader, image workers, catalog ...; built by session.start() in main()
+session = CrawlSession(sys.modules[__name__], ROW_WORKERS, timeout=15, extra_args=["--lang=en-US"])
 
 
 # -------------------------
@@ -61,86 +79,41 @@ def is_direct_image_url(url):
     return lower.endswith((".jpg", ".jpeg", ".png", ".webp"))
 
 
-def download_image_bytes(url):
-    try:
-        r = requests.get(url, headers=HEADERS, timeout=15)
-        if r.status_code == 200:
-            return r.content
-    except Exception:
-        pass
-    return None
-
-
-def image_validity_filter(img: Image.Image) -> bool:
-    w, h = img.size
-    if w < MIN_WIDTH or h < MIN_HEIGHT:
-        return False
-    # check how much of image is not close to white/blank
-    gray = img.convert("L")
-    stat = ImageStat.Stat(gray)
-    # compute ratio of bright pixels as rough proxy for blank background
-    # If too many bright pixels (i.e. image mostly white), reject
-    # Alternatively, you can use more sophisticated background detection
-    bright = sum(1 for px in gray.getdata() if px > 245)
-    total = w * h
-    if (total - bright) / total < MIN_NON_WHITE_RATIO:
-        return False
-    return True
-
-
-def save_image(content, path):
-    try:
-        img = Image.open(BytesIO(content)).convert("RGB")
-        img.save(path, format="JPEG", quality=90)
-        return True
-    except Exception as e:
-        return False
-
-
-def compute_img_hash(content):
-    try:
-        img = Image.open(BytesIO(content)).convert("L").resize((256, 256))
-        return str(imagehash.phash(img))
-    except Exception:
-        return None
+# ratio of bright pixels is a rough proxy for blank background:
+# if too many bright pixels (i.e. image mostly white), reject.
+# A picklable callable: it also runs in the cpu_pool workers.
+image_validity_filter = QualityCheck(MIN_WIDTH, MIN_HEIGHT, MIN_NON_WHITE_RATIO, fast=FAST_VALIDITY_CHECK)
 
 
 # -------------------------
 # AMAZON-SPECIFIC SCRAPING
 # -------------------------
 def extract_amazon_image_urls(page_source, base_url):
-    soup = BeautifulSoup(page_source, "html.parser")
-    urls = set()
+    urls = []
 
     # Pattern 1: data-a-dynamic-image
-    tag = soup.select_one("#imgTagWrapperId img")
+    tag = main_gallery_img(page_source)
     if tag:
         dynamic = tag.get("data-a-dynamic-image")
         if dynamic:
             try:
                 data = json.loads(dynamic)
-                for u in data.keys():
-                    urls.add(u)
+                urls.extend(data.keys())
             except:
                 pass
         src = tag.get("src")
         if src:
-            urls.add(src)
+            urls.append(src)
 
-    # Pattern 2: parse JSON blobs
-    for script in soup.find_all("script"):
-        txt = script.string
-        if not txt: continue
-        if "colorImages" in txt or "imageGalleryData" in txt:
-            for u in set(v for v in txt.split('"') if v.lower().startswith("http") and v.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))):
-                urls.add(u)
+    # Pattern 2: colorImages / imageGalleryData JSON blobs
+    urls.extend(gallery_json_urls(page_source))
 
     # Pattern 3: thumbnail / alt images
-    for img in soup.find_all("img"):
+    for img in iter_img_attrs(page_source):
         for attr in ("data-old-hires", "data-src", "src"):
             u = img.get(attr)
-            if u and isinstance(u, str):
-                urls.add(u)
+            if u:
+                urls.append(u)
 
     normalized = []
     for u in urls:
@@ -150,7 +123,7 @@ def extract_amazon_image_urls(page_source, base_url):
         if u0.startswith("/"):
             u0 = urljoin(base_url, u0)
         normalized.append(u0)
-    return normalized
+    return list(dict.fromkeys(normalized))  # dedupe, keep page order
 
 
 # -------------------------
@@ -158,18 +131,16 @@ def extract_amazon_image_urls(page_source, base_url):
 # -------------------------
 def extract_best_image_from_page(url):
     try:
-        driver.get(url)
-        time.sleep(0.7)
-        soup = BeautifulSoup(driver.page_source, "html.parser")
+        page = session.browsers.get_page(url)
 
         # og:image
-        og = soup.find("meta", property="og:image")
-        if og and og.get("content"):
-            return urljoin(url, og["content"])
+        og = og_image(page)
+        if og:
+            return urljoin(url, og)
 
         # fallback largest img by heuristic (width/height attributes)
         cand = []
-        for img in soup.find_all("img"):
+        for img in iter_img_attrs(page):
             src = img.get("src") or img.get("data-src") or ""
             if not src: continue
             src = src.strip()
@@ -194,17 +165,8 @@ def extract_best_image_from_page(url):
 # -------------------------
 # MAIN LOOP
 # -------------------------
-def process_product(row):
-    name = clean_name(row.get("product_name"))
-    if name == "Unknown_Product":
-        name = clean_name(row.get("product_title"))
-
-    product_dir = os.path.join(OUTPUT_ROOT, name)
-    os.makedirs(product_dir, exist_ok=True)
-
-    seen = set()
-    count = 0
-
+def discover_images(row):
+    """Candidate image URLs for one row, one image column at a time."""
     for col in IMAGE_COLS:
         raw = row.get(col)
         if not raw or str(raw).strip().lower() in ("", "nan", "none"):
@@ -215,34 +177,15 @@ def process_product(row):
         if "amazon." in urlparse(raw).netloc:
             print("Scraping Amazon images for:", raw)
             try:
-                driver.get(raw)
-                time.sleep(1.2)  # allow JS load
-                page = driver.page_source
+                page = session.browsers.get_page(raw)
             except Exception as e:
                 print("  Selenium load failed:", e)
                 continue
 
-            urls = extract_amazon_image_urls(page, raw)
-            for u in urls:
-                content = download_image_bytes(u)
-                if not content:
-                    continue
-                try:
-                    img = Image.open(BytesIO(content)).convert("RGB")
-                except:
-                    continue
-                if not image_validity_filter(img):
-                    continue
-                h = compute_img_hash(content)
-                if not h or h in seen:
-                    continue
-                seen.add(h)
-                count += 1
-                if count > MAX_IMAGES_PER_PRODUCT:
-                    break
-                save_image(content, os.path.join(product_dir, f"{name}_image{count}.jpg"))
-
-            # after finishing amazon url, do not process further raw urls for this product
+            found = extract_amazon_image_urls(page, raw)
+            urls = canonicalize_amazon_urls(found)
+            print(f"  {len(found)} candidate URLs → {len(urls)} unique product images")
+            yield from urls
             continue
 
         # Non-Amazon: pick one best image
@@ -251,42 +194,181 @@ def process_product(row):
         if not candidate:
             print("  No candidate found, skipping.")
             continue
-        content = download_image_bytes(candidate)
-        if not content:
-            continue
-        try:
-            img = Image.open(BytesIO(content)).convert("RGB")
-        except:
-            continue
-        if not image_validity_filter(img):
-            continue
-        h = compute_img_hash(content)
-        if not h or h in seen:
-            continue
-        seen.add(h)
-        count += 1
-        save_image(content, os.path.join(product_dir, f"{name}_image{count}.jpg"))
+        yield candidate
+
+
+def product_name(row):
+    name = clean_name(row.get("product_name"))
+    if name == "Unknown_Product":
+        name = clean_name(row.get("product_title"))
+    return name
+
 
-    if count == 0:
+def process_product(row):
+    name = product_name(row)
+
+    product_dir = os.path.join(OUTPUT_ROOT, name)
+    os.makedirs(product_dir, exist_ok=True)
+
+    # this folder is being re-crawled: its old hashes must not block its new images
+    session.catalog.forget_prefix(product_dir)
+
+    def image_path(n):
+        return os.path.join(product_dir, f"{name}_image{n}.jpg")
+
+    _, saved = session.pipeline.run(
+        discover_images(row), image_path, MAX_IMAGES_PER_PRODUCT, validate=image_validity_filter
+    )
+
+    if not saved:
         print("  Warning: no valid images for:", name)
     else:
-        print(f"  Saved {count} images for product: {name}")
+        print(f"  Saved {len(saved)} images for product: {name}")
+
+
+# -------------------------
+# STREAMING INGESTION
+# -------------------------
+def iter_rows(path, start=0):
+    """
+    (row number, row dict) from `start` on. CSV is streamed record by
+    record (quoted multi-line cells included), so memory does not grow
+    with the sheet; Excel files cannot be streamed and are loaded whole.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            yield from enumerate(islice(csv.DictReader(f), start, None), start)
+        return
+
+    import pandas as pd
+
+    df = pd.read_excel(path, dtype=str, keep_default_na=False)
+    for idx, row in df.iloc[start:].iterrows():
+        yield idx, row.to_dict()
+
+
+def process_row(idx, row):
+    try:
+        process_product(row)
+        session.catalog.checkpoint()
+    except Exception as ex:
+        session.metrics.count("products_failed")
+        print("!! Error processing row", idx, ex)
+    session.metrics.count("products")
+
+
+class RowFeeder:
+    """
+    Hands sheet rows to the browser pool as soon as a worker is free, with
+    at most `lookahead` rows read but not finished. Rows writing the same
+    folder run one after another in sheet order (later rows win, as
+    before), so the result does not depend on which worker gets there first.
+
+    `offset` is the first row not done yet with every row before it done;
+    it is written to RESUME_FILE whenever it moves.
+    """
+
+    def __init__(self, pool, start, lookahead=LOOKAHEAD_ROWS):
+        self.pool = pool
+        self.offset = start
+        self.done = 0
+        self.began = time.monotonic()
+        self._slots = threading.BoundedSemaphore(lookahead)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._queued = {}         # folder → rows waiting behind the one being processed
+        self._finished = set()    # rows done past `offset`
+        self._pending = 0
+
+    def add(self, idx, row):
+        self._slots.acquire()
+        name = product_name(row)
+        with self._lock:
+            self._pending += 1
+            if name in self._queued:
+                self._queued[name].append((idx, row))
+                return
+            self._queued[name] = deque()
+        self.pool.submit(self._run, name, idx, row)
+
+    def _run(self, name, idx, row):
+        while True:
+            process_row(idx, row)
+            with self._lock:
+                self._finish(idx)
+                rows = self._queued[name]
+                if not rows:
+                    del self._queued[name]
+                    return
+                idx, row = rows.popleft()
+
+    def _finish(self, idx):
+        self._finished.add(idx)
+        moved = False
+        while self.offset in self._finished:
+            self._finished.remove(self.offset)
+            self.offset += 1
+            moved = True
+        if moved:
+            try:
+                save_offset(self.offset)    # a restart with "resume" continues here
+            except OSError as ex:
+                print("!! Could not save resume offset:", ex)
+        self.done += 1
+        if self.done % REPORT_ROWS == 0:
+            elapsed = time.monotonic() - self.began
+            print(f"📄 {self.done} rows done, all before row {self.offset}, {self.done / elapsed:.2f} rows/s")
+        self._pending -= 1
+        self._idle.notify_all()
+        self._slots.release()
+
+    def join(self):
+        with self._idle:
+            while self._pending:
+                self._idle.wait()
+
+
+def start_row():
+    """Row to start from: `python conversion_script.py 500`, `... resume`, default 0."""
+    arg = sys.argv[1] if len(sys.argv) > 1 else "0"
+    if arg != "resume":
+        return int(arg)
+    try:
+        with open(RESUME_FILE, "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def save_offset(offset):
+    tmp = RESUME_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(str(offset))
+    os.replace(tmp, RESUME_FILE)
 
 
 def main():
     if not os.path.exists(INPUT_FILE):
         print("Input file missing:", INPUT_FILE)
         return
-    df = pd.read_csv(INPUT_FILE) if INPUT_FILE.lower().endswith(".csv") else pd.read_excel(INPUT_FILE)
-    os.makedirs(OUTPUT_ROOT, exist_ok=True)
 
-    for idx, row in df.iterrows():
-        try:
-            process_product(row)
-        except Exception as ex:
-            print("!! Error processing row", idx, ex)
+    os.makedirs(OUTPUT_ROOT, exist_ok=True)
+    session.start()
+    start = start_row()
+    print(f"📄 Reading {INPUT_FILE} from row {start}, up to {LOOKAHEAD_ROWS} rows ahead, {ROW_WORKERS} workers")
 
-    driver.quit()
+    try:
+        session.metrics.start_progress(0, PROGRESS_EVERY)
+        feeder = RowFeeder(session.browsers, start)
+        for idx, row in iter_rows(INPUT_FILE, start):
+            feeder.add(idx, row)
+        feeder.join()
+        print(f"📄 {feeder.done} rows done, {feeder.done / (time.monotonic() - feeder.began):.2f} rows/s")
+        session.metrics.stop_progress()
+
+        session.finish()
+    finally:
+        session.close()
     print("All done.")
     
 
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+MANIFEST_FILE = "crawl_manifest.sqlite"
+
+# Selectors understood by CrawlManifest.wants():
+#   "pending"        everything not yet finished successfully (default, = resume)
+#   "all"            every product
+#   "zero"           finished with 0 images, or never finished
+#   "lt:N"           finished with fewer than N images, or never finished
+#   "changed"        product record differs from the one last crawled
+#   "ids:a,b,c"      exactly these product_ids
+DEFAULT_SELECTOR = "pending"
+
+
+def record_hash(*parts):
+    """Stable fingerprint of a product record (for the "changed" selector)."""
+    blob = json.dumps(parts, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()
+
+
+def count_images(folder, exts=(".jpg", ".jpeg", ".png", ".webp")):
+    try:
+        return sum(1 for f in os.listdir(folder) if f.lower().endswith(exts))
+    except OSError:
+        return 0
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# =====================================================
+#                 CRAWL MANIFEST
+# =====================================================
+
+class CrawlManifest:
+    """
+    Per-product crawl state in SQLite: status, image count, source URLs
+    tried, output file hashes and the record fingerprint.
+
+    Each product costs two tiny writes (start + finish) in WAL mode with
+    synchronous=NORMAL, so the manifest never shows up next to network time.
+    A product left in "running" (crash, Ctrl-C) is simply crawled again.
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS products (
+                   product_id TEXT PRIMARY KEY,
+                   status TEXT NOT NULL,
+                   image_count INTEGER NOT NULL DEFAULT 0,
+                   record_hash TEXT,
+                   urls_tried TEXT,
+                   files TEXT,
+                   error TEXT,
+                   updated_at REAL NOT NULL
+               )"""
+        )
+        self._db.commit()
+
+    def get(self, product_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, image_count, record_hash FROM products WHERE product_id = ?",
+                (product_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "image_count": row[1], "record_hash": row[2]}
+
+    def wants(self, product_id, fingerprint, selector=DEFAULT_SELECTOR, existing=None):
+        """
+        Should this product be crawled under `selector`?
+
+        `existing` is the number of images already on disk; it stands in for
+        the image count of products crawled before the manifest existed.
+        """
+        if selector == "all":
+            return True
+        if selector.startswith("ids:"):
+            return product_id in {s.strip() for s in selector[4:].split(",")}
+
+        state = self.get(product_id)
+        if state is None and existing:
+            state = {"status": "done", "image_count": existing, "record_hash": None}
+        done = state is not None and state["status"] == "done"
+
+        if selector == "pending":
+            return not done
+        if selector == "changed":
+            return not done or state["record_hash"] not in (None, fingerprint)
+        if selector == "zero":
+            return not done or state["image_count"] == 0
+        if selector.startswith("lt:"):
+            return not done or state["image_count"] < int(selector[3:])
+
+        raise ValueError(f"Unknown crawl selector: {selector!r}")
+
+    def _write(self, product_id, status, **fields):
+        cols = ["product_id", "status", "updated_at"] + list(fields)
+        vals = [product_id, status, time.time()] + list(fields.values())
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO products ({', '.join(cols)}) "
+                f"VALUES ({', '.join('?' * len(cols))})",
+                vals,
+            )
+            self._db.commit()
+
+    def start(self, product_id, fingerprint):
+        self._write(product_id, "running", record_hash=fingerprint)
+
+    def finish(self, product_id, fingerprint, urls_tried, files):
+        """files: saved image paths; their SHA-256 is recorded alongside."""
+        hashes = {}
+        for path in files:
+            try:
+                hashes[path] = file_sha256(path)
+            except OSError:
+                pass
+        self._write(
+            product_id, "done",
+            image_count=len(hashes),
+            record_hash=fingerprint,
+            urls_tried=json.dumps(urls_tried),
+            files=json.dumps(hashes),
+        )
+
+    def fail(self, product_id, fingerprint, error):
+        self._write(product_id, "failed", record_hash=fingerprint, error=str(error))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
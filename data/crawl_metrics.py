@@ -0,0 +1,216 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+# histogram bucket upper bounds, seconds (one more bucket catches the rest)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+# =====================================================
+#                   HISTOGRAM
+# =====================================================
+
+class Histogram:
+    """Fixed-bucket latency histogram: constant memory however long the run."""
+
+    __slots__ = ("counts", "n", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.n += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile."""
+        rank = q * self.n
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.n,
+            "total_s": round(self.total, 4),
+            "mean_s": round(self.total / self.n, 4) if self.n else 0.0,
+            "p50_s": self.quantile(0.5),
+            "p95_s": self.quantile(0.95),
+            "p99_s": self.quantile(0.99),
+            "max_s": round(self.max, 4),
+            "buckets": {(f"le_{b}" if i < len(BUCKETS) else "inf"): n
+                        for i, (b, n) in enumerate(zip(BUCKETS + (None,), self.counts)) if n},
+        }
+
+
+# =====================================================
+#                   RUN METRICS
+# =====================================================
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class CrawlMetrics:
+    """
+    Per-stage latency histograms and counters for one crawl run, shared by
+    the browser pool, the downloader and the image pipeline (thread-safe).
+
+        with metrics.time("phash"): ...
+        metrics.observe("page_load", seconds)
+        metrics.count("rejected.too white")
+
+    `report()` / `write(path)` give the machine-readable summary;
+    `start_progress(total, every)` prints a progress + ETA line periodically.
+    Pass NULL_METRICS instead when instrumentation is off.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.histograms = {}        # stage → Histogram
+        self.counters = Counter()   # products / images_saved / rejected.<reason> ...
+        self.total = 0              # products expected, for the ETA
+        self._lock = threading.Lock()
+        self._stop = None
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = self.histograms[stage] = Histogram()
+            hist.observe(seconds)
+
+    def time(self, stage):
+        return _Timer(self, stage)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    # ------------------------
+    # REPORTING
+    # ------------------------
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def progress_line(self):
+        with self._lock:
+            done = self.counters["products"]
+            images = self.counters["images_saved"]
+        elapsed = self.elapsed()
+        of = f"/{self.total}" if self.total else ""     # 0 = unknown (streamed input)
+        line = f"📈 {done}{of} products, {images} images, {images / elapsed:.1f} img/s"
+        if done and self.total > done:
+            eta = elapsed / done * (self.total - done)
+            line += f", ETA {int(eta // 60)}m{int(eta % 60):02d}s"
+        return line
+
+    def start_progress(self, total, every):
+        """Print progress_line() every `every` seconds until stop_progress()."""
+        self.total = total
+        if not every or self._stop is not None:
+            return
+        self._stop = threading.Event()
+
+        def loop(stop):
+            while not stop.wait(every):
+                print(self.progress_line())
+
+        threading.Thread(target=loop, args=(self._stop,), daemon=True).start()
+
+    def stop_progress(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+    def report(self, **extra):
+        """Everything measured so far as a JSON-ready dict; `extra` sections are merged in."""
+        elapsed = self.elapsed()
+        with self._lock:
+            counters = dict(sorted(self.counters.items()))
+            stages = {name: h.to_dict() for name, h in sorted(self.histograms.items())}
+        images = counters.get("images_saved", 0)
+        products = counters.get("products", 0)
+        data = {
+            "elapsed_s": round(elapsed, 3),
+            "products": products,
+            "images_saved": images,
+            "images_per_s": round(images / elapsed, 3) if elapsed else 0.0,
+            "products_per_min": round(products * 60 / elapsed, 3) if elapsed else 0.0,
+            "rejected": {k.split(".", 1)[1]: n for k, n in counters.items() if k.startswith("rejected.")},
+            "counters": {k: n for k, n in counters.items()
+                         if not k.startswith("rejected.") and k not in ("products", "images_saved")},
+            "stages": stages,
+        }
+        data.update(extra)
+        return data
+
+    def write(self, path, **extra):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.report(**extra), f, indent=2)
+        os.replace(tmp, path)
+
+    def summary(self, top=6):
+        """One line: the stages where most time went."""
+        with self._lock:
+            busiest = sorted(self.histograms.items(), key=lambda kv: kv[1].total, reverse=True)[:top]
+        return ", ".join(f"{name} {h.total:.1f}s/{h.n} (p95 {h.quantile(0.95)}s)" for name, h in busiest)
+
+
+class NullMetrics:
+    """Same interface as CrawlMetrics, does nothing: instrumentation off."""
+
+    enabled = False
+    _timer = nullcontext()
+
+    def observe(self, stage, seconds):
+        pass
+
+    def time(self, stage):
+        return self._timer
+
+    def count(self, name, n=1):
+        pass
+
+    def start_progress(self, total, every):
+        pass
+
+    def stop_progress(self):
+        pass
+
+
+NULL_METRICS = NullMetrics()
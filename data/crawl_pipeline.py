@@ -0,0 +1,342 @@
+import os
+import queue
+import tempfile
+import threading
+from collections import Counter
+
+from crawl_metrics import NULL_METRICS
+from download_spool import release_body
+from image_processing import DecodedImage, rejection
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+DECODE_WORKERS = 2     # decode + validity check
+PHASH_WORKERS = 2
+WRITE_WORKERS = 2      # JPEG encode + write to a temp file
+QUEUE_SIZE = 4         # items waiting between two stages
+MAX_IN_FLIGHT = 16     # candidates anywhere in the pipeline at once (bounds memory)
+
+_DONE = object()
+
+
+# =====================================================
+#              GENERIC STAGED PIPELINE
+# =====================================================
+#
+#   discovery ─▶ fetch ─▶ decode/validate ─▶ phash ─▶ encode/write ─▶ dedupe
+#   (caller)    (N thr)      (N thr)        (N thr)     (N thr)      (1, in order)
+#
+# Stages are joined by small bounded queues and every item holds one of
+# MAX_IN_FLIGHT slots from the moment it is discovered until it leaves the
+# last stage, so a 500-image gallery needs no more memory than a 5-image one.
+# A rejected item keeps flowing (marked with a reason) so that ordered
+# stages can still count it.
+
+class Candidate:
+    """One image URL moving through the stages."""
+
+    __slots__ = ("seq", "url", "content", "img", "hash", "tmp", "path", "reason")
+
+    def __init__(self, seq, url):
+        self.seq = seq
+        self.url = url
+        self.content = None
+        self.img = None
+        self.hash = None
+        self.tmp = None         # encoded image, written but not yet in place
+        self.path = None
+        self.reason = None      # why it was dropped (None = still alive)
+
+
+class Stage:
+    """
+    `fn(candidate)` run on `workers` threads. It rejects a candidate by
+    setting `candidate.reason`; rejected candidates skip later stages.
+
+    An `ordered` stage runs on a single thread, sees candidates strictly in
+    discovery order and is called for rejected ones too. A `cancellable`
+    stage stops doing work once the pipeline's stop flag is set.
+    """
+
+    def __init__(self, name, fn, workers=1, ordered=False, cancellable=True):
+        self.name = name
+        self.fn = fn
+        self.workers = 1 if ordered else workers
+        self.ordered = ordered
+        self.cancellable = cancellable
+
+
+def _run_one(stage, c, stop, metrics):
+    if c.reason is not None and not stage.ordered:
+        return
+    if stage.cancellable and stop.is_set():
+        c.reason = c.reason or "cancelled"
+        return
+    try:
+        with metrics.time(f"stage.{stage.name}"):
+            stage.fn(c)
+    except Exception:
+        c.reason = c.reason or f"{stage.name} error"
+
+
+def run_stages(source, stages, stop=None, max_in_flight=MAX_IN_FLIGHT,
+               queue_size=QUEUE_SIZE, on_done=None, metrics=NULL_METRICS):
+    """
+    Push every URL from `source` through `stages`; returns once all are done.
+
+    `source` is iterated on the calling thread (so thread-bound resources such
+    as the BrowserPool's per-thread Chrome keep working) and is abandoned as
+    soon as `stop` is set. `on_done(candidate)` is called for each finished
+    candidate on the collector thread. Each stage call is timed into
+    `metrics` as "stage.<name>".
+    """
+    stop = stop or threading.Event()
+    slots = threading.BoundedSemaphore(max_in_flight)
+    queues = [queue.Queue(queue_size) for _ in stages] + [queue.Queue()]
+    threads = []
+    left = [stage.workers for stage in stages]
+    lock = threading.Lock()
+
+    def finish_stage(i):
+        # the last worker of stage i to exit tells every worker of stage i+1
+        with lock:
+            left[i] -= 1
+            last = left[i] == 0
+        if last:
+            nxt = stages[i + 1].workers if i + 1 < len(stages) else 1
+            for _ in range(nxt):
+                queues[i + 1].put(_DONE)
+
+    def worker(i):
+        stage, inq, outq = stages[i], queues[i], queues[i + 1]
+        pending, expected = {}, 0
+        while True:
+            c = inq.get()
+            if c is _DONE:
+                break
+            if not stage.ordered:
+                _run_one(stage, c, stop, metrics)
+                outq.put(c)
+                continue
+            pending[c.seq] = c
+            while expected in pending:
+                c = pending.pop(expected)
+                expected += 1
+                _run_one(stage, c, stop, metrics)
+                outq.put(c)
+        finish_stage(i)
+
+    def collector():
+        while True:
+            c = queues[-1].get()
+            if c is _DONE:
+                return
+            if c.img is not None:
+                c.img.release()
+            release_body(c.content)
+            c.content = c.img = None
+            if on_done is not None:
+                on_done(c)
+            slots.release()
+
+    for i, stage in enumerate(stages):
+        for _ in range(stage.workers):
+            threads.append(threading.Thread(target=worker, args=(i,), daemon=True))
+    threads.append(threading.Thread(target=collector, daemon=True))
+    for t in threads:
+        t.start()
+
+    try:
+        urls = iter(source)
+        seq = 0
+        while True:
+            slots.acquire()
+            # checked before pulling: the next URL may cost a page load
+            url = next(urls, _DONE) if not stop.is_set() else _DONE
+            if url is _DONE:
+                slots.release()
+                break
+            queues[0].put(Candidate(seq, url))
+            seq += 1
+    finally:
+        for _ in range(stages[0].workers):
+            queues[0].put(_DONE)
+        for t in threads:
+            t.join()
+
+
+# =====================================================
+#              PRODUCT IMAGE PIPELINE
+# =====================================================
+
+class ImagePipeline:
+    """
+    The crawlers' download → validate → hash → dedupe → save chain as a
+    staged pipeline, shared by all three scripts.
+
+    Results are exactly those of the old serial loop: candidates are
+    claimed against the phash catalog in discovery order, numbered in that
+    order, and the run stops at `limit` saved images. Only the product's
+    own images can make a candidate a duplicate, so what a product saves
+    does not depend on which other products were crawled before it.
+
+    Every image is encoded into a temp file in the product folder before
+    the ordered dedupe stage, which only renames it into place. A path is
+    taken (and claimed in the catalog) only once its file exists, so a
+    failed encode or write never leaves a gap in the numbering.
+
+    With a `cpu_pool` (image_workers.ImageProcessPool) decode, validate,
+    phash and JPEG encode run in worker processes as one stage, and the
+    write stage only puts the encoded bytes on disk.
+
+    `fetch_workers` downloads run per product; the caller sizes it so that
+    all products crawled at once fill the downloader's concurrency.
+    """
+
+    def __init__(self, downloader, catalog, near_dup_distance, fetch_workers, quality=90,
+                 decode_workers=DECODE_WORKERS, phash_workers=PHASH_WORKERS, write_workers=WRITE_WORKERS,
+                 max_in_flight=MAX_IN_FLIGHT, cpu_pool=None, metrics=NULL_METRICS):
+        self.downloader = downloader
+        self.catalog = catalog
+        self.cpu_pool = cpu_pool
+        self.metrics = metrics      # crawl_metrics.CrawlMetrics: per-stage timings, rejections
+        self.near_dup_distance = near_dup_distance
+        self.quality = quality
+        self.fetch_workers = fetch_workers
+        self.decode_workers = decode_workers
+        self.phash_workers = phash_workers
+        self.write_workers = write_workers
+        # room for every fetch and every decode / process task at once
+        busy = cpu_pool.concurrency if cpu_pool is not None else decode_workers
+        self.max_in_flight = max(max_in_flight, fetch_workers + busy)
+        self.stats = Counter()      # saved / rejection reasons, across all runs
+        self._lock = threading.Lock()
+
+    def run(self, urls, path_for, limit, validate=None, probe=True):
+        """
+        Fetch and save images from the `urls` iterable (may be a lazy
+        generator that scrapes pages as it goes).
+
+        `path_for(n)` names the n-th saved image, `validate(img)` is the
+        optional quality check (picklable when a cpu_pool is used).
+        Returns (tried urls, saved paths).
+        """
+        stop = threading.Event()
+        folder = os.path.dirname(path_for(1))
+        tried, saved = [], []
+        reasons = Counter()
+        metrics = self.metrics
+
+        def fetch(c):
+            c.content = self.downloader.fetch(c.url, probe)
+            if not c.content:
+                c.reason = "not downloaded"
+
+        def decode(c):
+            try:
+                with metrics.time("decode"):
+                    c.img = DecodedImage(c.content)
+            except Exception:
+                c.reason = "undecodable"
+                return
+            finally:
+                release_body(c.content)
+                c.content = None
+            with metrics.time("validate"):
+                c.reason = rejection(validate, c.img)
+
+        def phash(c):
+            with metrics.time("phash"):
+                c.hash = c.img.phash()
+            if not c.hash:
+                c.reason = "no hash"
+
+        def process(c):
+            # content: downloaded bytes in, encoded JPEG out
+            content = c.content
+            try:
+                c.reason, c.hash, c.content, timings = self.cpu_pool.process(content, validate)
+            finally:
+                release_body(content)
+            if metrics.enabled:
+                for step, seconds in zip(("decode", "validate", "phash", "encode"), timings):
+                    if seconds:
+                        metrics.observe(step, seconds)
+
+        def write(c):
+            fd, c.tmp = tempfile.mkstemp(suffix=".tmp", dir=folder)
+            if c.img is None:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(c.content)
+                release_body(c.content)
+                c.content = None
+                return
+            os.close(fd)
+            with metrics.time("encode"):
+                if not c.img.save_jpeg(c.tmp, quality=self.quality):
+                    c.reason = "encode error"
+
+        def dedupe(c):
+            if len(saved) >= limit:
+                stop.set()
+                c.reason = c.reason or "over limit"
+                return
+            tried.append(c.url)
+            if c.reason is not None:
+                return
+            path = path_for(len(saved) + 1)
+            duplicate, shared = self.catalog.claim(c.hash, path, self.near_dup_distance)
+            if duplicate:
+                c.reason = "duplicate"    # near-duplicate of an image this product already has
+                return
+            try:
+                # replace, never rewrite: the old file may be a hard link into blob_store
+                os.replace(c.tmp, path)
+            except OSError:
+                self.catalog.discard(c.hash, path)
+                c.reason = "write error"
+                return
+            c.tmp = None
+            if shared:
+                # another product shows the same photo: kept (blob_store links identical files)
+                metrics.count("images_shared")
+                with self._lock:
+                    self.stats["shared with another product"] += 1
+            c.path = path
+            saved.append(path)
+            if len(saved) >= limit:
+                stop.set()
+
+        def done(c):
+            if c.tmp is not None:
+                try:
+                    os.remove(c.tmp)      # rejected after it was encoded
+                except OSError:
+                    pass
+            reasons[c.reason or "saved"] += 1
+            if c.reason is None:
+                metrics.count("images_saved")
+            elif c.reason not in ("over limit", "cancelled"):
+                metrics.count(f"rejected.{c.reason}")
+
+        if self.cpu_pool is not None:
+            cpu = [Stage("process", process, self.cpu_pool.concurrency)]
+        else:
+            cpu = [Stage("decode", decode, self.decode_workers),
+                   Stage("phash", phash, self.phash_workers)]
+
+        stages = [
+            Stage("fetch", fetch, self.fetch_workers),
+            *cpu,
+            Stage("write", write, self.write_workers),
+            Stage("dedupe", dedupe, ordered=True, cancellable=False),
+        ]
+        run_stages(urls, stages, stop, max_in_flight=self.max_in_flight, on_done=done,
+                   metrics=metrics)
+
+        with self._lock:
+            self.stats.update(reasons)
+        return tried, saved
@@ -0,0 +1,252 @@
+"""
+Everything a crawler script runs on, built and torn down in one place.
+
+json_img_crawler, add_new_images and conversion_script each keep their own
+CONFIG block and hand their module to a CrawlSession, which reads these
+settings from it by name when start() is called:
+
+    CPU_WORKERS, HEADERS, HOST_RATE, RESTART_AFTER_PAGES, PAGE_READY_TIMEOUT,
+    HTTP_CACHE_DIR, HTTP_CACHE_MAX_MB, CACHE_ONLY, METRICS_FILE, PROGRESS_EVERY,
+    DOWNLOAD_CONCURRENCY, DOWNLOAD_PER_HOST, MIN_WIDTH, MIN_HEIGHT,
+    MAX_DOWNLOAD_MB, MAX_IMAGE_MEGAPIXELS, SPOOL_OVER_MB, PHASH_INDEX_FILE,
+    NEAR_DUP_DISTANCE, OUTPUT_ROOT, VARIANT_WIDTHS, VARIANTS_MANIFEST,
+    BLOB_STORE and, if the script tracks products, MANIFEST_FILE.
+
+The product_final.json crawlers (json_img_crawler, add_new_images) also
+share their driver: crawl_products() selects products through the crawl
+manifest and runs the script's process_product on each, and
+discover_images() turns a product's source URLs into image candidates.
+
+Nothing is started before start(): importing a script stays free.
+"""
+
+import math
+
+from amazon_urls import canonicalize_amazon_urls
+from blob_store import BlobStore
+from browser_pool import BrowserPool
+from crawl_manifest import CrawlManifest, count_images, record_hash
+from crawl_metrics import NULL_METRICS, CrawlMetrics
+from crawl_pipeline import ImagePipeline
+from http_cache import HttpCache
+from image_downloader import AsyncDownloader
+from image_variants import build_variants, savings_report
+from image_workers import start_image_workers
+from phash_index import PhashIndex
+from rate_limiter import RateLimiter
+
+
+class CrawlSession:
+    """
+    `workers` products are crawled in parallel (one Chrome each);
+    `timeout` is the per-attempt image download timeout and `extra_args`
+    go to every Chrome.
+    """
+
+    def __init__(self, config, workers, timeout=12, extra_args=()):
+        self.config = config
+        self.workers = workers
+        self.timeout = timeout
+        self.extra_args = list(extra_args)
+
+        self.cpu_pool = None
+        self.http_cache = None
+        self.metrics = NULL_METRICS
+        self.limiter = None
+        self.browsers = None
+        self.downloader = None
+        self.catalog = None
+        self.manifest = None
+        self.pipeline = None
+
+    def start(self, page_pool=None, resolver=None, metrics=None):
+        """
+        Build everything. `page_pool(limiter, metrics)`, `resolver` and
+        `metrics` let bench_crawler swap in its stand-ins for Chrome, DNS and
+        the configured metrics.
+        """
+        c = self.config
+
+        # forked first, before the downloader and browsers start their threads
+        self.cpu_pool = start_image_workers(c.CPU_WORKERS)
+
+        if c.HTTP_CACHE_DIR:
+            self.http_cache = HttpCache(c.HTTP_CACHE_DIR, c.HTTP_CACHE_MAX_MB * 1024 ** 2,
+                                        offline=c.CACHE_ONLY)
+
+        # per-stage timings and counters; NULL_METRICS when off, which costs nothing
+        if metrics is None:
+            metrics = CrawlMetrics() if c.METRICS_FILE or c.PROGRESS_EVERY else NULL_METRICS
+        self.metrics = metrics
+
+        # one pacing state per host, shared by page loads and image downloads
+        self.limiter = RateLimiter(c.HOST_RATE)
+
+        # Chrome is only launched on the first Amazon / fallback page load
+        if page_pool is not None:
+            self.browsers = page_pool(self.limiter, metrics)
+        else:
+            self.browsers = BrowserPool(self.workers, restart_after=c.RESTART_AFTER_PAGES,
+                                        extra_args=self.extra_args, max_wait=c.PAGE_READY_TIMEOUT,
+                                        cache=self.http_cache, limiter=self.limiter, metrics=metrics)
+
+        self.downloader = AsyncDownloader(
+            c.HEADERS,
+            timeout=self.timeout,
+            max_concurrency=c.DOWNLOAD_CONCURRENCY,
+            per_host=c.DOWNLOAD_PER_HOST,
+            cache=self.http_cache,
+            limiter=self.limiter,
+            metrics=metrics,
+            resolver=resolver,
+            min_size=(c.MIN_WIDTH, c.MIN_HEIGHT),   # too-small images are dropped from their header bytes
+            max_bytes=c.MAX_DOWNLOAD_MB * 1024 ** 2,
+            max_pixels=c.MAX_IMAGE_MEGAPIXELS * 1000 ** 2,
+            spool_over=c.SPOOL_OVER_MB * 1024 ** 2,
+        )
+
+        # phash of every image saved so far, by product folder, kept across runs
+        self.catalog = PhashIndex(c.PHASH_INDEX_FILE)
+
+        # per-product crawl state, lets an interrupted run pick up where it stopped
+        manifest_file = getattr(c, "MANIFEST_FILE", None)
+        if manifest_file:
+            self.manifest = CrawlManifest(manifest_file)
+
+        # fetch → decode/validate → phash → write → dedupe, overlapped per product;
+        # `workers` products at once share DOWNLOAD_CONCURRENCY downloads
+        fetch_workers = math.ceil(c.DOWNLOAD_CONCURRENCY / self.workers)
+        self.pipeline = ImagePipeline(self.downloader, self.catalog, c.NEAR_DUP_DISTANCE, fetch_workers,
+                                      cpu_pool=self.cpu_pool, metrics=metrics)
+
+    def finish(self, folders=None):
+        """
+        After the crawl: size variants and blob store for `folders` (None =
+        the whole output tree) and the run report. Call close() afterwards.
+        """
+        c = self.config
+        metrics = self.metrics
+
+        self.catalog.save()     # crawl_product only checkpoints it
+
+        if c.VARIANT_WIDTHS:
+            # unchanged images are skipped, so a whole-tree pass is cheap too
+            with metrics.time("variants"):
+                variants = build_variants(c.OUTPUT_ROOT, folders, pool=self.cpu_pool,
+                                          widths=c.VARIANT_WIDTHS, manifest_path=c.VARIANTS_MANIFEST)
+            report = savings_report(variants)
+            if report:
+                print(f"🖼 variants: {report}")
+
+        if c.BLOB_STORE:
+            with metrics.time("blob_store"):
+                store = BlobStore(c.BLOB_STORE, c.OUTPUT_ROOT)
+                files, freed = store.ingest(folders)    # already-linked files are not re-hashed
+                freed += store.gc()     # blobs of images replaced by this crawl
+            print(f"🔗 {files} image files in {c.BLOB_STORE}, {freed / 1e6:.2f} MB of duplicates freed")
+
+        report = self.browsers.latency_report()
+        if report:
+            print(f"⏱ page loads: {report}")
+        stats = self.downloader.stats
+        print(f"📉 {stats['bytes'] / 1e6:.1f} MB downloaded, skipped early: "
+              f"{stats['rejected_small']} too small, {stats['rejected_type']} not images, "
+              f"{stats['rejected_length']} too large, {stats['rejected_pixels']} too many pixels; "
+              f"{stats['spooled']} spooled to disk")
+        print(f"🚦 {self.limiter.report()}")
+        print("🧮 " + ", ".join(f"{n} {reason}" for reason, n in self.pipeline.stats.most_common()))
+        if metrics.enabled:
+            print(f"📊 slowest stages: {metrics.summary()}")
+        if c.METRICS_FILE:
+            metrics.write(c.METRICS_FILE, downloads=dict(stats), rate_limiter=dict(self.limiter.stats),
+                          page_signals=dict(self.browsers.signals), pipeline=dict(self.pipeline.stats))
+            print(f"📁 Metrics saved to: {c.METRICS_FILE}")
+
+    # ------------------------
+    # PRODUCT_FINAL.JSON CRAWL
+    # ------------------------
+    def discover_images(self, prod, extract):
+        """
+        Candidate image URLs of a product, scraping one source URL at a time;
+        `extract(page_source)` pulls the image URLs out of an Amazon page.
+        """
+        for url in prod.get("image_urls", []):
+            if "amazon." in url:
+                print("  🛒 Amazon URL → scraping full gallery...")
+                try:
+                    found = extract(self.browsers.get_page(url))
+                except Exception:
+                    found = []
+                imgs = canonicalize_amazon_urls(found)
+                print(f"  🧹 {len(found)} candidate URLs → {len(imgs)} unique product images")
+                yield from imgs
+            else:
+                yield url  # direct non-Amazon image link
+
+    def crawl_product(self, process, prod, category_name, subcategory_name):
+        """process(prod, category, subcategory) + manifest bookkeeping."""
+        pid = prod["product_id"]
+        fingerprint = record_hash(prod, category_name, subcategory_name)
+
+        self.manifest.start(pid, fingerprint)
+        try:
+            tried, saved = process(prod, category_name, subcategory_name)
+        except Exception as e:
+            self.manifest.fail(pid, fingerprint, e)
+            self.metrics.count("products_failed")
+            raise
+        finally:
+            self.metrics.count("products")
+        self.manifest.finish(pid, fingerprint, tried, saved)
+        # a resumed run skips this product; a crash loses at most SAVE_EVERY
+        # seconds of its hashes, which only feed the "shared" report
+        self.catalog.checkpoint()
+
+    def crawl_products(self, data, selector, process, folder_of):
+        """
+        Crawl the products of a product_final.json-shaped `data` that the
+        manifest `selector` picks (see crawl_manifest.py), then finish().
+        `folder_of(pid, category, subcategory)` is a product's image folder.
+        """
+        jobs = [
+            (prod, cat_name, sub_name)
+            for cat_name, cat_data in data["categories"].items()
+            for sub_name, sub_data in cat_data["subcategories"].items()
+            for prod in sub_data["products"]
+            if self.manifest.wants(
+                prod["product_id"],
+                record_hash(prod, cat_name, sub_name),
+                selector,
+                existing=count_images(folder_of(prod["product_id"], cat_name, sub_name)),
+            )
+        ]
+        print(f"📋 {len(jobs)} products selected ({selector})")
+
+        # each product is crawled start-to-finish by one browser worker
+        self.metrics.start_progress(len(jobs), self.config.PROGRESS_EVERY)
+        self.browsers.map(lambda job: self.crawl_product(process, *job), jobs,
+                          label=lambda job: job[0]["product_id"])
+        self.metrics.stop_progress()
+
+        self.finish([folder_of(prod["product_id"], cat, sub) for prod, cat, sub in jobs])
+
+    def close(self):
+        """
+        Stop the browsers, downloader and image workers; save the catalog.
+        Safe to call more than once, and after an interrupted crawl.
+        """
+        if self.browsers is not None:
+            self.browsers.close()
+            self.browsers = None
+        if self.catalog is not None:
+            self.catalog.save()
+            self.catalog = None
+        if self.manifest is not None:
+            self.manifest.close()
+            self.manifest = None
+        if self.downloader is not None:
+            self.downloader.close()
+            self.downloader = None
+        if self.cpu_pool is not None:
+            self.cpu_pool.close()
+            self.cpu_pool = None
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+SPOOL_OVER = 1024 * 1024    # bodies larger than this go to a temp file instead of memory
+SPOOL_DIR = None            # None = the system temp dir
+SPOOL_PREFIX = "prosmart_dl_"
+
+
+# =====================================================
+#              DOWNLOADS SPOOLED TO DISK
+# =====================================================
+#
+# Almost every product image is a few hundred KB and stays in memory as
+# bytes. The rare big one (a 25 MB "image", a video behind a .jpg URL that
+# slipped past the header checks) is streamed to a temp file instead and
+# travels through the pipeline as a SpooledBody: the decoder and the image
+# worker processes open the file themselves, so its bytes are never held
+# in the crawler's memory, let alone copied.
+
+class SpooledBody:
+    """A downloaded body living in a temp file. Delete it with release()."""
+
+    __slots__ = ("path", "size")
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __bool__(self):
+        return self.size > 0
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def release(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def new_spool_file(spool_dir=SPOOL_DIR):
+    """(open binary file, path) of a fresh spool file."""
+    fd, path = tempfile.mkstemp(prefix=SPOOL_PREFIX, suffix=".part", dir=spool_dir)
+    return os.fdopen(fd, "wb"), path
+
+
+def link_into_spool(path, spool_dir=SPOOL_DIR):
+    """A SpooledBody sharing `path`'s bytes (hard link, copy as a fallback),
+    so releasing it never touches the original (e.g. a cache blob)."""
+    f, spool_path = new_spool_file(spool_dir)
+    f.close()
+    os.remove(spool_path)
+    try:
+        os.link(path, spool_path)
+    except OSError:
+        shutil.copyfile(path, spool_path)
+    return SpooledBody(spool_path, os.path.getsize(spool_path))
+
+
+def release_body(body):
+    """Delete the temp file behind `body` if it is spooled (no-op for bytes)."""
+    if isinstance(body, SpooledBody):
+        body.release()
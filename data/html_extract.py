@@ -0,0 +1,136 @@
+import html
+import json
+import re
+
+
+# =====================================================
+#          TARGETED HTML EXTRACTION (NO DOM TREE)
+# =====================================================
+#
+# The crawlers only ever need four things from a page: <img> attributes,
+# the main gallery <img> under #imgTagWrapperId, the og:image meta and the
+# colorImages / imageGalleryData script blobs. Scanning for those with
+# compiled regexes is an order of magnitude cheaper than building a full
+# BeautifulSoup tree of a multi-MB Amazon page.
+
+TAG_IMG = re.compile(r"<img\b([^>]*)>", re.I)
+TAG_META = re.compile(r"<meta\b([^>]*)>", re.I)
+ATTR = re.compile(
+    r"""([^\s"'>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?""",
+    re.S,
+)
+# patterns start with a literal so the regex engine can skip ahead quickly
+MAIN_IMAGE_WRAPPER = re.compile(r"""imgTagWrapperId["'\s>]""")
+ID_ATTR_BEFORE = re.compile(r"""\bid\s*=\s*["']?$""", re.I)
+GALLERY_KEYS = re.compile(r"""(?:colorImages|imageGalleryData)["']?\s*:""")
+IMAGE_URL = re.compile(r"""https?://[^\s"'\\<>]+?\.(?:jpe?g|png|webp)""", re.I)
+
+
+def parse_attrs(raw):
+    """Attribute string of a tag → {name: value} (lowercase names, entities decoded)."""
+    attrs = {}
+    for m in ATTR.finditer(raw):
+        name = m.group(1).lower()
+        if name in attrs:
+            continue
+        value = m.group(2)
+        if value is None:
+            value = m.group(3) if m.group(3) is not None else (m.group(4) or "")
+        attrs[name] = html.unescape(value)
+    return attrs
+
+
+def iter_img_attrs(page):
+    """Attributes of every <img> tag, in page order."""
+    for m in TAG_IMG.finditer(page):
+        yield parse_attrs(m.group(1))
+
+
+def main_gallery_img(page):
+    """Attributes of the first <img> inside #imgTagWrapperId, or None."""
+    for wrapper in MAIN_IMAGE_WRAPPER.finditer(page):
+        # must be the id attribute itself, not e.g. a "#imgTagWrapperId img" CSS rule
+        if not ID_ATTR_BEFORE.search(page, max(0, wrapper.start() - 16), wrapper.start()):
+            continue
+        m = TAG_IMG.search(page, wrapper.end())
+        return parse_attrs(m.group(1)) if m else None
+    return None
+
+
+def og_image(page):
+    """content of <meta property="og:image">, or None."""
+    for m in TAG_META.finditer(page):
+        attrs = parse_attrs(m.group(1))
+        if attrs.get("property") == "og:image" and attrs.get("content"):
+            return attrs["content"]
+    return None
+
+
+def _balanced(page, start):
+    """End index (exclusive) of the [...] or {...} literal opening at `start`."""
+    opening = page[start]
+    closing = "]" if opening == "[" else "}"
+    depth = 0
+    quote = None
+    i = start
+    n = len(page)
+    while i < n:
+        c = page[i]
+        if quote:
+            if c == "\\":
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c in "\"'":
+            quote = c
+        elif c == opening:
+            depth += 1
+        elif c == closing:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return None
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            yield k
+            yield from _strings(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _strings(v)
+
+
+def gallery_json_urls(page):
+    """
+    Image URLs from the colorImages / imageGalleryData script blobs.
+
+    Each blob is cut out by bracket matching and decoded as JSON; if the
+    blob is not strict JSON (Amazon sometimes emits JS literals) its image
+    URLs are pulled out with a regex instead.
+    """
+    urls = []
+    for m in GALLERY_KEYS.finditer(page):
+        start = m.end()
+        while start < len(page) and page[start] in " \t\r\n":
+            start += 1
+        if start >= len(page) or page[start] not in "[{":
+            continue
+        end = _balanced(page, start)
+        if end is None:
+            continue
+
+        blob = page[start:end]
+        try:
+            candidates = _strings(json.loads(blob))
+        except ValueError:
+            candidates = (u.group(0) for u in IMAGE_URL.finditer(blob))
+
+        for u in candidates:
+            if u.lower().startswith("http") and u.lower().endswith((".jpg", ".jpeg", ".png", ".webp")):
+                urls.append(u)
+    return urls
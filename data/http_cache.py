@@ -0,0 +1,210 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from download_spool import SPOOL_OVER, SpooledBody, link_into_spool
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+CACHE_DIR = ".http_cache"
+CACHE_MAX_BYTES = 2 * 1024 ** 3     # LRU-evict once bodies exceed this
+PAGE_MAX_AGE = 7 * 24 * 3600        # reuse rendered pages for a week
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+HASH_CHUNK = 1024 * 1024            # read size when hashing a spooled body
+
+
+def normalize_url(url: str) -> str:
+    """Cache key form: lowercase scheme/host, no default port, no fragment, sorted query."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def _sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# =====================================================
+#             CONTENT-ADDRESSED RESPONSE CACHE
+# =====================================================
+
+class HttpCache:
+    """
+    On-disk cache for image bytes and rendered page HTML.
+
+    Bodies are stored once per SHA-256 under blobs/, metadata (URL, ETag,
+    Last-Modified, last access) lives in a small SQLite table keyed by the
+    normalized URL. With `offline=True` the network is never touched:
+    callers only get what is already cached.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, offline=False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.offline = offline
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                   url TEXT PRIMARY KEY,
+                   sha256 TEXT NOT NULL,
+                   size INTEGER NOT NULL,
+                   etag TEXT,
+                   last_modified TEXT,
+                   stored_at REAL NOT NULL,
+                   accessed_at REAL NOT NULL
+               )"""
+        )
+        self._db.commit()
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _blob_path(self, sha):
+        return os.path.join(self.root, "blobs", sha[:2], sha)
+
+    # ------------------------
+    # READ
+    # ------------------------
+    def lookup(self, url):
+        """Metadata dict for url, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sha256, etag, last_modified, stored_at FROM entries WHERE url = ?",
+                (normalize_url(url),),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"sha256": row[0], "etag": row[1], "last_modified": row[2], "stored_at": row[3]}
+
+    def read(self, url, entry=None, spool=False):
+        """
+        Cached body for url (bytes) or None; counts as an access for LRU.
+        With `spool=True` a body over SPOOL_OVER comes back as a SpooledBody
+        linked to the blob instead of being read into memory.
+        """
+        entry = entry or self.lookup(url)
+        if entry is None:
+            return None
+        path = self._blob_path(entry["sha256"])
+        try:
+            if spool and os.path.getsize(path) > SPOOL_OVER:
+                body = link_into_spool(path)
+            else:
+                with open(path, "rb") as f:
+                    body = f.read()
+        except OSError:
+            return None
+        self.touch(url)
+        return body
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def touch(self, url):
+        with self._lock:
+            self._db.execute(
+                "UPDATE entries SET accessed_at = ? WHERE url = ?", (time.time(), normalize_url(url))
+            )
+            self._db.commit()
+
+    # ------------------------
+    # WRITE
+    # ------------------------
+    def store(self, url, body, etag=None, last_modified=None):
+        """Cache `body` (bytes, or a SpooledBody: hashed in chunks and hard-linked, not copied)."""
+        spooled = isinstance(body, SpooledBody)
+        sha = _sha256_file(body.path) if spooled else hashlib.sha256(body).hexdigest()
+        path = self._blob_path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            if spooled:
+                try:
+                    os.link(body.path, tmp)
+                except OSError:
+                    shutil.copyfile(body.path, tmp)
+            else:
+                with open(tmp, "wb") as f:
+                    f.write(body)
+            os.replace(tmp, path)
+
+        now = time.time()
+        key = normalize_url(url)
+        with self._lock:
+            old = self._db.execute("SELECT sha256, size FROM entries WHERE url = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, sha, len(body), etag, last_modified, now, now),
+            )
+            if old and old[0] != sha:
+                self._drop_blob(old[0])     # the URL's previous body (a re-rendered page ...)
+            self._db.commit()
+            self._total += len(body) - (old[1] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def store_text(self, url, text: str):
+        self.store(url, text.encode("utf-8"))
+
+    def read_text(self, url, max_age=PAGE_MAX_AGE):
+        """Cached page HTML if younger than max_age (any age when offline)."""
+        entry = self.lookup(url)
+        if entry is None:
+            return None
+        if not self.offline and time.time() - entry["stored_at"] > max_age:
+            return None
+        body = self.read(url, entry)
+        return body.decode("utf-8") if body is not None else None
+
+    def _evict(self):
+        """Drop least-recently-used entries until under budget (lock held)."""
+        target = int(self.max_bytes * 0.9)
+        rows = self._db.execute(
+            "SELECT url, sha256, size FROM entries ORDER BY accessed_at"
+        ).fetchall()
+        for url, sha, size in rows:
+            if self._total <= target:
+                break
+            self._db.execute("DELETE FROM entries WHERE url = ?", (url,))
+            self._total -= size
+            self._drop_blob(sha)
+        self._db.commit()
+
+    def _drop_blob(self, sha):
+        """Delete a blob no entry refers to any more (lock held)."""
+        # blobs are shared between URLs with identical bodies
+        still_used = self._db.execute(
+            "SELECT 1 FROM entries WHERE sha256 = ? LIMIT 1", (sha,)
+        ).fetchone()
+        if not still_used:
+            try:
+                os.remove(self._blob_path(sha))
+            except OSError:
+                pass
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,254 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+
+from crawl_metrics import NULL_METRICS
+from download_spool import SPOOL_OVER, SpooledBody, new_spool_file
+from image_probe import probe_dimensions
+from rate_limiter import MAX_RETRIES, RETRY_STATUSES, URL_DEADLINE, RateLimiter, backoff
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+MAX_CONCURRENCY = 32      # open sockets across all hosts
+MAX_PER_HOST = 8          # open sockets against a single host
+KEEPALIVE_TIMEOUT = 30    # seconds an idle pooled connection is kept
+
+CHUNK_SIZE = 16 * 1024    # streamed read size
+PROBE_LIMIT = 64 * 1024   # stop looking for image dimensions after this many bytes
+ACCEPTED_TYPES = ("image/", "application/octet-stream", "binary/octet-stream")
+
+RETRY = object()          # _attempt sentinel: transient failure, try again
+
+
+# =====================================================
+#              ASYNC DOWNLOAD ENGINE
+# =====================================================
+
+class AsyncDownloader:
+    """
+    Pooled keep-alive HTTP downloader running on a background asyncio loop.
+
+    The crawler scripts stay synchronous: they hand over a list of URLs and
+    read the bodies back while the loop keeps every download in flight.
+    """
+
+    def __init__(self, headers=None, timeout=12,
+                 max_concurrency=MAX_CONCURRENCY, per_host=MAX_PER_HOST, cache=None,
+                 min_size=None, max_bytes=None, limiter=None, deadline=URL_DEADLINE,
+                 max_retries=MAX_RETRIES, metrics=NULL_METRICS, resolver=None,
+                 max_pixels=None, spool_over=SPOOL_OVER, spool_dir=None):
+        self.headers = headers or {}
+        self.timeout = timeout      # per attempt
+        self.deadline = deadline    # per URL, all attempts together
+        self.max_retries = max_retries
+        self.limiter = limiter or RateLimiter()   # share with the BrowserPool
+        self.cache = cache          # optional http_cache.HttpCache
+        self.min_size = min_size    # (w, h): abort downloads whose header says smaller
+        self.max_bytes = max_bytes  # abort downloads larger than this
+        self.max_pixels = max_pixels  # abort downloads whose header says more pixels (decode bomb)
+        self.spool_over = spool_over  # bodies past this many bytes stream to a temp file
+        self.spool_dir = spool_dir
+        self.stats = Counter()      # bytes / spooled / rejected_type / _length / _small / _pixels
+        self.metrics = metrics      # "download" / "rate_wait" timings (crawl_metrics)
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.resolver = resolver    # optional aiohttp resolver (bench_crawler maps hosts to localhost)
+
+        self._session = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    # ------------------------
+    # LOOP SIDE
+    # ------------------------
+    async def _get_session(self):
+        if self._session is None:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                limit_per_host=self.per_host,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                resolver=self.resolver,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def _fetch(self, url, probe=True):
+        cache = self.cache
+        entry = None
+        if cache is not None:
+            entry = await asyncio.to_thread(cache.lookup, url)
+            if cache.offline:
+                return await asyncio.to_thread(cache.read, url, entry, True) if entry else None
+
+        start = time.perf_counter()
+        body = await self._fetch_live(url, entry, probe)
+        self.metrics.observe("download", time.perf_counter() - start)
+        return body
+
+    async def _fetch_live(self, url, entry, probe):
+        """Every attempt at one URL, retries and backoff included."""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            result = await self._attempt(url, entry, probe, deadline)
+            if result is not RETRY:
+                return result
+
+            attempt += 1
+            delay = backoff(attempt)
+            if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                self.limiter.count("gave_up")
+                return None
+            self.limiter.count("retries")
+            await asyncio.sleep(delay)
+
+    async def _attempt(self, url, entry, probe, deadline):
+        """One rate-limited request: body, None (final) or RETRY (transient)."""
+        import aiohttp
+
+        with self.metrics.time("rate_wait"):
+            ready = await self.limiter.wait_async(url, deadline - time.monotonic())
+        if not ready:
+            self.limiter.count("gave_up")     # host too backed up to make the deadline
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+
+        session = await self._get_session()
+        cache = self.cache
+        headers = cache.conditional_headers(entry) if cache is not None else None
+        timeout = aiohttp.ClientTimeout(total=min(self.timeout, remaining))
+        start = time.monotonic()
+        try:
+            async with session.get(url, headers=headers, timeout=timeout) as r:
+                self.limiter.record(url, r.status, time.monotonic() - start,
+                                    r.headers.get("Retry-After"))
+                if r.status in RETRY_STATUSES:
+                    return RETRY
+                if r.status == 304 and entry:
+                    body = await asyncio.to_thread(cache.read, url, entry, True)
+                    if body is not None:
+                        return body
+                    # evicted between lookup and read → fetch it again in full
+                    async with session.get(url, timeout=timeout) as full:
+                        return await self._accept(url, full, probe)
+                return await self._accept(url, r, probe)
+        except asyncio.CancelledError:
+            raise
+        except aiohttp.InvalidURL:
+            return None
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.limiter.record(url, None, time.monotonic() - start)
+            return RETRY
+        except Exception:
+            return None
+
+    async def _accept(self, url, r, probe):
+        """Read a 200 response through the probe and store it in the cache."""
+        if r.status != 200:
+            return None
+        body = await self._read_body(r, probe)
+        if body is not None and self.cache is not None:
+            await asyncio.to_thread(
+                self.cache.store, url, body,
+                r.headers.get("ETag"), r.headers.get("Last-Modified"),
+            )
+        return body
+
+    async def _read_body(self, r, probe):
+        """
+        Stream the body, giving up as early as possible on:
+          - a Content-Type that is not an image
+          - a Content-Length (or running total) above max_bytes
+          - header dimensions below min_size or above max_pixels
+            (parsed from the first few KB)
+        Returning from here without reading the rest closes the connection,
+        so the remaining bytes are never transferred.
+
+        Bodies up to spool_over bytes come back as bytes. Past that the
+        stream continues into a temp file and a SpooledBody is returned, so
+        the memory held per download never exceeds spool_over + CHUNK_SIZE.
+        """
+        ctype = r.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if ctype and not ctype.startswith(ACCEPTED_TYPES):
+            self.stats["rejected_type"] += 1
+            return None
+        if self.max_bytes and (r.content_length or 0) > self.max_bytes:
+            self.stats["rejected_length"] += 1
+            return None
+
+        check_small = probe and self.min_size is not None
+        probing = check_small or bool(self.max_pixels)
+        buf = bytearray()
+        spool = None            # (file, path) once the body outgrew spool_over
+        size = 0
+        try:
+            async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+                size += len(chunk)
+                self.stats["bytes"] += len(chunk)
+                if self.max_bytes and size > self.max_bytes:
+                    self.stats["rejected_length"] += 1
+                    return None
+                if spool is not None:
+                    spool[0].write(chunk)
+                    continue
+
+                buf += chunk
+                if probing:
+                    dims = probe_dimensions(buf)
+                    if dims:
+                        probing = False
+                        if check_small and (dims[1] < self.min_size[0] or dims[2] < self.min_size[1]):
+                            self.stats["rejected_small"] += 1
+                            return None
+                        if self.max_pixels and dims[1] * dims[2] > self.max_pixels:
+                            self.stats["rejected_pixels"] += 1
+                            return None
+                    elif len(buf) >= PROBE_LIMIT:
+                        probing = False      # unknown format / huge header: let the decoder judge
+
+                if self.spool_over is not None and size > self.spool_over:
+                    spool = new_spool_file(self.spool_dir)
+                    spool[0].write(buf)
+                    buf = None
+                    self.stats["spooled"] += 1
+
+            if spool is None:
+                return bytes(buf)
+            spool[0].close()
+            body, spool = SpooledBody(spool[1], size), None
+            return body
+        finally:
+            if spool is not None:            # rejected / cancelled half-way
+                spool[0].close()
+                SpooledBody(spool[1], size).release()
+
+    # ------------------------
+    # CALLER SIDE
+    # ------------------------
+    def submit(self, url, probe=True):
+        """Schedule one download, returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(self._fetch(url, probe), self._loop)
+
+    def fetch(self, url, probe=True):
+        """Blocking single download (bytes, SpooledBody or None)."""
+        return self.submit(url, probe).result()
+
+    def close(self):
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+            self._session = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
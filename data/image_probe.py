@@ -0,0 +1,72 @@
+import struct
+
+
+# =====================================================
+#          IMAGE DIMENSIONS FROM THE FIRST FEW KB
+# =====================================================
+
+# JPEG start-of-frame markers (everything in C0..CF except DHT, JPG, DAC)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg_size(head):
+    i = 2
+    n = len(head)
+    while i + 4 <= n:
+        if head[i] != 0xFF:
+            return None                      # not at a marker → corrupt / unsupported
+        marker = head[i + 1]
+        if marker == 0xFF:                   # fill byte
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2                           # standalone markers, no length
+            continue
+        seg_len = struct.unpack(">H", head[i + 2:i + 4])[0]
+        if marker in _JPEG_SOF:
+            if i + 9 > n:
+                return None
+            h, w = struct.unpack(">HH", head[i + 5:i + 9])
+            return w, h
+        i += 2 + seg_len
+    return None
+
+
+def _webp_size(head):
+    if len(head) < 30:
+        return None
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        w, h = struct.unpack("<HH", head[26:30])
+        return w & 0x3FFF, h & 0x3FFF
+    if chunk == b"VP8L":
+        b = head[21:25]
+        w = 1 + (((b[1] & 0x3F) << 8) | b[0])
+        h = 1 + (((b[3] & 0x0F) << 10) | (b[2] << 2) | ((b[1] & 0xC0) >> 6))
+        return w, h
+    if chunk == b"VP8X":
+        w = 1 + int.from_bytes(head[24:27], "little")
+        h = 1 + int.from_bytes(head[27:30], "little")
+        return w, h
+    return None
+
+
+def probe_dimensions(head):
+    """
+    (format, width, height) parsed from the start of an image file, or None
+    if the bytes seen so far are not enough (or not a known format).
+    """
+    head = bytes(head)
+    if head[:3] == b"\xff\xd8\xff":
+        size = _jpeg_size(head)
+        return ("jpeg",) + size if size else None
+    if head[:8] == b"\x89PNG\r\n\x1a\n" and len(head) >= 24:
+        w, h = struct.unpack(">II", head[16:24])
+        return "png", w, h
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        size = _webp_size(head)
+        return ("webp",) + size if size else None
+    if head[:6] in (b"GIF87a", b"GIF89a") and len(head) >= 10:
+        w, h = struct.unpack("<HH", head[6:10])
+        return "gif", w, h
+    return None
@@ -0,0 +1,146 @@
+import math
+from io import BytesIO
+
+from PIL import Image
+
+from download_spool import SpooledBody
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+BRIGHT_THRESHOLD = 245            # gray level above which a pixel counts as "white"
+FAST_PATH_MAX_PIXELS = 1_000_000  # images above this are sampled on the fast path
+
+
+# =====================================================
+#             VECTORIZED VALIDITY CHECK
+# =====================================================
+
+def non_white_ratio(img: Image.Image, fast=False, max_pixels=FAST_PATH_MAX_PIXELS):
+    """
+    Fraction of pixels whose gray level is <= BRIGHT_THRESHOLD.
+
+    Counts on a NumPy view of the grayscale image instead of iterating
+    pixels in Python. With `fast=True`, images above `max_pixels` are
+    nearest-neighbour sampled on a regular grid first, which gives the same
+    ratio to within a fraction of a percent for far less work.
+    """
+    import numpy as np
+
+    w, h = img.size
+    if fast and w * h > max_pixels:
+        step = math.ceil(math.sqrt(w * h / max_pixels))
+        img = img.resize((max(1, w // step), max(1, h // step)), Image.NEAREST)
+
+    gray = np.asarray(img if img.mode == "L" else img.convert("L"))
+    bright = np.count_nonzero(gray > BRIGHT_THRESHOLD)
+    return 1 - bright / gray.size
+
+
+def is_valid_image(img: Image.Image, min_width, min_height, min_non_white_ratio, fast=False):
+    """Min-size rejection + "not mostly white" check."""
+    w, h = img.size
+    if w < min_width or h < min_height:
+        return False
+    return non_white_ratio(img, fast=fast) >= min_non_white_ratio
+
+
+# =====================================================
+#              DECODE-ONCE IMAGE OBJECT
+# =====================================================
+
+class DecodedImage:
+    """
+    A downloaded image decoded exactly once and carried through the
+    validate → hash → save stages.
+
+    The grayscale view and phash are computed on first use and cached.
+    `release()` drops every pixel buffer; `save_jpeg` calls it, so at most
+    one decoded copy per in-flight image is ever alive.
+    """
+
+    def __init__(self, content):
+        # raises on undecodable bytes, same as the old Image.open() check;
+        # a download spooled to disk is decoded straight from its file
+        source = content.path if isinstance(content, SpooledBody) else BytesIO(content)
+        self.img = Image.open(source)
+        self.img.load()
+        self.size = self.img.size
+        self._gray = None
+        self._phash = None
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = self.img.convert("L")
+        return self._gray
+
+    def is_valid(self, min_width, min_height, min_non_white_ratio, fast=False):
+        w, h = self.size
+        if w < min_width or h < min_height:
+            return False
+        return non_white_ratio(self.gray, fast=fast) >= min_non_white_ratio
+
+    def phash(self):
+        """phash string (256x256 grayscale, as before) or None."""
+        if self._phash is None:
+            import imagehash
+
+            try:
+                self._phash = str(imagehash.phash(self.gray.resize((256, 256))))
+            except Exception:
+                return None
+        return self._phash
+
+    def save_jpeg(self, path, quality=90):
+        try:
+            rgb = self.img if self.img.mode == "RGB" else self.img.convert("RGB")
+            rgb.save(path, format="JPEG", quality=quality)
+            return True
+        except Exception:
+            return False
+        finally:
+            self.release()
+
+    def release(self):
+        if self.img is not None:
+            self.img.close()
+        self.img = None
+        self._gray = None
+
+
+class QualityCheck:
+    """
+    `DecodedImage.is_valid` with the thresholds bound, as a picklable
+    callable so it can be shipped to image worker processes.
+    """
+
+    def __init__(self, min_width, min_height, min_non_white_ratio, fast=False):
+        self.min_width = min_width
+        self.min_height = min_height
+        self.min_non_white_ratio = min_non_white_ratio
+        self.fast = fast
+
+    def __call__(self, img: DecodedImage):
+        return img.is_valid(self.min_width, self.min_height, self.min_non_white_ratio, fast=self.fast)
+
+    def reject_reason(self, img: DecodedImage):
+        """None if img passes, otherwise "too small" or "too white"."""
+        w, h = img.size
+        if w < self.min_width or h < self.min_height:
+            return "too small"
+        if non_white_ratio(img.gray, fast=self.fast) < self.min_non_white_ratio:
+            return "too white"
+        return None
+
+
+def rejection(validate, img):
+    """Why `validate` rejects img (None = accepted, or no check at all)."""
+    if validate is None:
+        return None
+    reject_reason = getattr(validate, "reject_reason", None)
+    if reject_reason is not None:
+        return reject_reason(img)
+    return None if validate(img) else "invalid"
@@ -0,0 +1,338 @@
+import argparse
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from PIL import Image
+
+from crawl_manifest import file_sha256
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+IMAGE_ROOT = "prosmart_images"
+VARIANTS_MANIFEST = "image_variants.json"
+VARIANT_DIR = "variants"             # <prod folder>/variants/<format>/<stem>_w<width>.<ext>
+
+VARIANT_WIDTHS = (200, 400, 800, 1600)   # never upscaled: the ladder stops at the original width
+VARIANT_FORMATS = {                  # format → (extension, save options)
+    "webp": (".webp", {"quality": 80, "method": 4}),
+    "jpeg": (".jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+REPORT_WIDTH = 800                   # width a product page is assumed to show, for the savings report
+VALID_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+
+_INDEX = re.compile(r"(\d+)$")    # trailing image number: prod_0007_img12, Foo_image3
+
+
+# =====================================================
+#              ONE IMAGE → ITS SIZE LADDER
+# =====================================================
+#
+# Runs in the cpu_pool worker processes (or threads): module-level and
+# picklable. Each original is decoded once, every rung is resized from that
+# decode. Freshness goes by content, not mtime: the manifest records the
+# sha256 each ladder was made from, and an original with the same sha only
+# gets its missing rungs. (blob_store swaps a re-crawled file for a link to
+# an older blob, so its mtime can go back in time.)
+
+def ladder(width, widths=VARIANT_WIDTHS):
+    """Widths to generate for an original `width` pixels wide."""
+    rungs = [w for w in sorted(widths) if w < width]
+    if len(rungs) < len(widths):
+        rungs.append(width)      # the original size itself, re-encoded
+    return rungs
+
+
+def variant_path(image_path, fmt, width):
+    folder, name = os.path.split(image_path)
+    stem = os.path.splitext(name)[0]
+    ext = VARIANT_FORMATS[fmt][0]
+    return os.path.join(folder, VARIANT_DIR, fmt, f"{stem}_w{width}{ext}")
+
+
+def make_variants(image_path, widths=VARIANT_WIDTHS, built_from=None):
+    """
+    Write every variant of one original; returns its manifest entry
+    {"path", "sha256", "width", "height", "bytes", "variants": {fmt: [{path, width, height, bytes}]}}
+    or None if the original cannot be decoded. `built_from` is the sha256
+    the existing variants were made from: if the original still has it,
+    only missing rungs are written.
+    """
+    try:
+        sha = file_sha256(image_path)
+        img = Image.open(image_path)
+        w, h = img.size
+    except Exception:
+        return None
+
+    rungs = ladder(w, widths)
+    todo = [(fmt, rw) for fmt in VARIANT_FORMATS for rw in rungs
+            if sha != built_from or not os.path.exists(variant_path(image_path, fmt, rw))]
+
+    try:
+        if todo:
+            img = img.convert("RGB")
+            resized = {}
+            for fmt, rw in todo:
+                if rw not in resized:
+                    rh = max(1, round(h * rw / w))
+                    resized[rw] = img if rw == w else img.resize((rw, rh), Image.LANCZOS, reducing_gap=3.0)
+                out = variant_path(image_path, fmt, rw)
+                os.makedirs(os.path.dirname(out), exist_ok=True)
+                tmp = out + ".tmp"
+                resized[rw].save(tmp, fmt.upper(), **VARIANT_FORMATS[fmt][1])
+                os.replace(tmp, out)
+    except Exception:
+        return None
+    finally:
+        img.close()
+
+    variants = {}
+    for fmt in VARIANT_FORMATS:
+        variants[fmt] = []
+        for rw in rungs:
+            out = variant_path(image_path, fmt, rw)
+            variants[fmt].append({
+                "path": out,
+                "width": rw,
+                "height": max(1, round(h * rw / w)),
+                "bytes": os.path.getsize(out),
+            })
+    return {"path": image_path, "sha256": sha, "width": w, "height": h,
+            "bytes": os.path.getsize(image_path), "variants": variants}
+
+
+def _make_variants(item, widths=VARIANT_WIDTHS):
+    """make_variants over (path, built_from) pairs, for pool.imap."""
+    return make_variants(item[0], widths, item[1])
+
+
+# =====================================================
+#                PER-PRODUCT MANIFEST
+# =====================================================
+
+def image_index(path):
+    """prod_0007_img12.jpg → 12 (so img10 sorts after img9)."""
+    m = _INDEX.search(os.path.splitext(os.path.basename(path))[0])
+    return int(m.group(1)) if m else 0
+
+
+def originals(folder):
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return []
+    paths = [os.path.join(folder, n) for n in names
+             if os.path.splitext(n)[1].lower() in VALID_EXT]
+    return sorted(paths, key=lambda p: (image_index(p), p))
+
+
+def product_folders(root):
+    """Every folder under root that directly holds original images."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d != VARIANT_DIR)
+        if any(os.path.splitext(f)[1].lower() in VALID_EXT for f in filenames):
+            yield dirpath
+
+
+def prune_stale(folder, entries):
+    """Delete variants whose original is gone (re-crawled product)."""
+    keep = {v["path"] for e in entries for vs in e["variants"].values() for v in vs}
+    vroot = os.path.join(folder, VARIANT_DIR)
+    removed = 0
+    for dirpath, _, filenames in os.walk(vroot):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if path not in keep:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def _url(path, root, base_url):
+    return base_url + os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def manifest_entry(entry, root, base_url=""):
+    """Absolute local paths → URLs relative to root (or under base_url)."""
+    return {
+        "url": _url(entry["path"], root, base_url),
+        "sha256": entry["sha256"],
+        "width": entry["width"],
+        "height": entry["height"],
+        "bytes": entry["bytes"],
+        "variants": {
+            fmt: [{"url": _url(v["path"], root, base_url), "width": v["width"],
+                   "height": v["height"], "bytes": v["bytes"]} for v in vs]
+            for fmt, vs in entry["variants"].items()
+        },
+    }
+
+
+def load_manifest(path=VARIANTS_MANIFEST):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, path=VARIANTS_MANIFEST):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(dict(sorted(manifest.items())), f, indent=2)
+    os.replace(tmp, path)
+
+
+def build_variants(root=IMAGE_ROOT, folders=None, pool=None, workers=None,
+                   widths=VARIANT_WIDTHS, manifest_path=VARIANTS_MANIFEST, base_url=""):
+    """
+    Generate the size ladder for every original in `folders` (default: every
+    product folder under root) and update those products in the manifest.
+
+    Images are spread over `pool` (an image_workers.ImageProcessPool) when
+    given, otherwise over `workers` threads — Pillow releases the GIL while
+    resizing and encoding. Returns the updated manifest.
+    """
+    whole_tree = folders is None
+    folders = sorted(set(folders)) if folders is not None else list(product_folders(root))
+    paths = [p for folder in folders for p in originals(folder)]
+
+    # sha256 each original's current variants were made from
+    manifest = load_manifest(manifest_path)
+    built_from = {e["url"]: e.get("sha256") for es in manifest.values() for e in es}
+    items = [(p, built_from.get(_url(p, root, base_url))) for p in paths]
+    task = partial(_make_variants, widths=widths)
+
+    if pool is not None:
+        results = pool.imap(task, items)
+    else:
+        with ThreadPoolExecutor(workers or os.cpu_count() or 1) as ex:
+            results = list(ex.map(task, items))
+
+    by_folder = {folder: [] for folder in folders}
+    for path, entry in zip(paths, results):
+        if entry is None:
+            print(f"  ⚠ Could not make variants of {path}")
+            continue
+        by_folder[os.path.dirname(path)].append(entry)
+
+    if whole_tree:
+        live = {os.path.basename(folder) for folder in folders}
+        for pid in [pid for pid in manifest if pid not in live]:
+            del manifest[pid]      # product folder deleted since the last build
+    for folder, entries in by_folder.items():
+        prune_stale(folder, entries)
+        pid = os.path.basename(folder)
+        if entries:
+            manifest[pid] = [manifest_entry(e, root, base_url) for e in entries]
+        else:
+            manifest.pop(pid, None)
+    save_manifest(manifest, manifest_path)
+    return manifest
+
+
+# =====================================================
+#             SRCSET FOR THE STOREFRONT JSON
+# =====================================================
+
+def srcset(entry):
+    """
+    One manifest image → the structure the storefront puts in <picture>:
+    {"src", "width", "height", "srcset": {mime type: "url 200w, url 400w, ..."}}
+    """
+    sets = {
+        f"image/{fmt}": ", ".join(f"{v['url']} {v['width']}w" for v in vs)
+        for fmt, vs in entry["variants"].items()
+    }
+    jpegs = entry["variants"].get("jpeg") or []
+    fallback = next((v for v in jpegs if v["width"] >= REPORT_WIDTH), jpegs[-1] if jpegs else None)
+    return {
+        "src": fallback["url"] if fallback else entry["url"],
+        "width": entry["width"],
+        "height": entry["height"],
+        "srcset": sets,
+    }
+
+
+def attach_variants(products, manifest):
+    """Add `image_variants` (one srcset structure per image, in image order)
+    to every product of a claudinary_product.json-shaped dict."""
+    attached = 0
+    for cat in products["categories"].values():
+        for sub in cat["subcategories"].values():
+            for prod in sub["products"]:
+                entries = manifest.get(prod["product_id"])
+                if entries:
+                    prod["image_variants"] = [srcset(e) for e in entries]
+                    attached += 1
+                else:
+                    prod.pop("image_variants", None)
+    return attached
+
+
+def page_bytes(entry, fmt="webp", width=REPORT_WIDTH):
+    """Bytes of the variant a browser would pick for a `width`-px slot."""
+    vs = entry["variants"].get(fmt) or []
+    pick = next((v for v in vs if v["width"] >= width), vs[-1] if vs else None)
+    return pick["bytes"] if pick else entry["bytes"]
+
+
+def savings_report(manifest, width=REPORT_WIDTH):
+    originals_total = sum(e["bytes"] for es in manifest.values() for e in es)
+    if not originals_total:
+        return None
+    parts = []
+    for fmt in VARIANT_FORMATS:
+        total = sum(page_bytes(e, fmt, width) for es in manifest.values() for e in es)
+        parts.append(f"{fmt}@{width}w {total / 1e6:.1f} MB (-{100 * (1 - total / originals_total):.0f}%)")
+    images = sum(len(es) for es in manifest.values())
+    return (f"{len(manifest)} products, {images} images: originals {originals_total / 1e6:.1f} MB → "
+            + ", ".join(parts))
+
+
+# =====================================================
+#                       CLI
+# =====================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate responsive image variants and their manifest.")
+    parser.add_argument("--root", default=IMAGE_ROOT)
+    parser.add_argument("--manifest", default=VARIANTS_MANIFEST)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--base-url", default="", help="prefix for variant URLs (default: paths relative to root)")
+    parser.add_argument("--attach", metavar="PRODUCT_JSON",
+                        help="also write image_variants into this claudinary_product.json-style file")
+    parser.add_argument("--no-build", action="store_true",
+                        help="do not generate anything, only --attach an existing manifest "
+                             "(e.g. cloudinary_variant_urls.json)")
+    args = parser.parse_args()
+
+    if args.no_build:
+        manifest = load_manifest(args.manifest)
+    else:
+        print(f"🖼 Generating {'/'.join(map(str, VARIANT_WIDTHS))}px "
+              f"{' + '.join(VARIANT_FORMATS)} variants under {args.root} ...")
+        manifest = build_variants(args.root, workers=args.workers,
+                                  manifest_path=args.manifest, base_url=args.base_url)
+        print(f"📁 Manifest saved to: {args.manifest}")
+    report = savings_report(manifest)
+    if report:
+        print(f"📦 {report}")
+
+    if args.attach:
+        with open(args.attach, "r", encoding="utf-8") as f:
+            products = json.load(f)
+        n = attach_variants(products, manifest)
+        with open(args.attach, "w", encoding="utf-8") as f:
+            json.dump(products, f, indent=2)
+        print(f"🔗 image_variants attached to {n} products in {args.attach}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import multiprocessing
+import queue
+import time
+from io import BytesIO
+from multiprocessing import shared_memory
+
+from download_spool import SpooledBody
+from image_processing import DecodedImage, rejection
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+SLOT_SIZE = 4 * 1024 * 1024   # per-task shared buffer; bigger images are pickled instead
+SLOTS_PER_WORKER = 2          # tasks queued per process so none sits idle between images
+
+
+# =====================================================
+#              WORKER PROCESS SIDE
+# =====================================================
+#
+# Raw downloaded bytes go in, (reason, phash, JPEG bytes) come out. Both
+# directions travel through one shared-memory block split into fixed
+# slots: the parent copies the download into a slot, the worker decodes it
+# from there and writes the re-encoded JPEG back into the same slot. Only
+# the slot number and a few small values go through the pool's pipes.
+
+_shm = None
+_slot_size = SLOT_SIZE
+
+
+def _init_worker(shm_name, slot_size):
+    global _shm, _slot_size
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _slot_size = slot_size
+
+
+def _process(content, validate, quality):
+    """
+    decode → validate → phash → JPEG encode; returns (reason, phash, BytesIO,
+    seconds spent in each of those four steps).
+    """
+    t0 = time.perf_counter()
+    try:
+        img = DecodedImage(content)
+    except Exception:
+        return "undecodable", None, None, (time.perf_counter() - t0, 0.0, 0.0, 0.0)
+
+    try:
+        t1 = time.perf_counter()
+        reason = rejection(validate, img)
+        t2 = time.perf_counter()
+        if reason is not None:
+            return reason, None, None, (t1 - t0, t2 - t1, 0.0, 0.0)
+        h = img.phash()
+        t3 = time.perf_counter()
+        if not h:
+            return "no hash", None, None, (t1 - t0, t2 - t1, t3 - t2, 0.0)
+        out = BytesIO()
+        ok = img.save_jpeg(out, quality=quality)
+        timings = (t1 - t0, t2 - t1, t3 - t2, time.perf_counter() - t3)
+        if not ok:
+            return "encode error", None, None, timings
+        return None, h, out, timings
+    finally:
+        img.release()
+
+
+def _process_slot(slot, length, validate, quality):
+    start = slot * _slot_size
+    view = _shm.buf[start:start + length]
+    try:
+        reason, h, out, timings = _process(view, validate, quality)
+    finally:
+        view.release()
+    if out is None:
+        return reason, h, 0, None, timings
+
+    encoded = out.getbuffer()
+    n = len(encoded)
+    if n > _slot_size:
+        return reason, h, n, bytes(encoded), timings     # does not fit → back through the pipe
+    _shm.buf[start:start + n] = encoded
+    return reason, h, n, None, timings
+
+
+def _process_bytes(content, validate, quality):
+    reason, h, out, timings = _process(content, validate, quality)
+    return reason, h, (out.getvalue() if out is not None else None), timings
+
+
+# =====================================================
+#                   PARENT SIDE
+# =====================================================
+
+class ImageProcessPool:
+    """
+    Decode / validate / phash / JPEG-encode in worker processes, off the
+    crawler's GIL. `process()` is blocking and thread-safe: the pipeline's
+    CPU stage threads each wait on one task.
+
+    Workers are forked, so create the pool before the crawler starts its
+    own threads (downloader loop, browser pool).
+    """
+
+    def __init__(self, workers, quality=90, slot_size=SLOT_SIZE):
+        self.workers = workers
+        self.quality = quality
+        self.slot_size = slot_size
+
+        slots = workers * SLOTS_PER_WORKER
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_size)
+        self.free = queue.Queue()
+        for i in range(slots):
+            self.free.put(i)
+
+        ctx = multiprocessing.get_context("fork")
+        self.pool = ctx.Pool(workers, initializer=_init_worker, initargs=(self.shm.name, slot_size))
+
+    @property
+    def concurrency(self):
+        """Tasks to keep in flight to saturate every worker."""
+        return self.workers * SLOTS_PER_WORKER
+
+    def process(self, content, validate=None):
+        """
+        (reason, phash, jpeg bytes, step timings) for one downloaded image;
+        reason is None when the image is valid, otherwise why it was
+        rejected. Timings are the seconds spent decoding, validating,
+        hashing and encoding inside the worker.
+        `validate` must be picklable (e.g. image_processing.QualityCheck).
+        """
+        if isinstance(content, SpooledBody) or len(content) > self.slot_size:
+            # a SpooledBody pickles as its file path: the worker reads the file itself
+            return self.pool.apply(_process_bytes, (content, validate, self.quality))
+
+        slot = self.free.get()
+        start = slot * self.slot_size
+        try:
+            self.shm.buf[start:start + len(content)] = content
+            reason, h, n, encoded, timings = self.pool.apply(
+                _process_slot, (slot, len(content), validate, self.quality)
+            )
+            if encoded is None and n:
+                encoded = bytes(self.shm.buf[start:start + n])
+        finally:
+            self.free.put(slot)
+        return reason, h, encoded, timings
+
+    def imap(self, fn, items, chunksize=4):
+        """Ordered results of a module-level `fn` over items, in the workers
+        (used for batch jobs such as image_variants)."""
+        return self.pool.imap(fn, items, chunksize)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.shm.close()
+        self.shm.unlink()
+
+
+def start_image_workers(workers, quality=90):
+    """An ImageProcessPool, or None (= decode in threads) when workers is 0 or
+    the platform cannot fork (Windows)."""
+    if workers <= 0 or "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    return ImageProcessPool(workers, quality=quality)
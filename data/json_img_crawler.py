@@ -1,17 +1,11 @@
 import os
-import time
+import sys
 import json
-import requests
-from io import BytesIO
 from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
-from PIL import Image
-import imagehash
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from html_extract import iter_img_attrs, main_gallery_img
+from crawl_session import CrawlSession
+from image_processing import QualityCheck
 
 # ============ CONFIG ============
 
@@ -22,6 +16,34 @@ MAX_IMAGES_PER_PRODUCT = 25
 MIN_WIDTH = 200
 MIN_HEIGHT = 200
 MIN_NON_WHITE_RATIO = 0.20
+FAST_VALIDITY_CHECK = False  # sample very large images instead of counting every pixel
+CPU_WORKERS = max(0, (os.cpu_count() or 1) - 1)  # decode/phash/encode processes (0 = in-process threads)
+NEAR_DUP_DISTANCE = 4       # phash bits; closer images of one product count as duplicates
+PHASH_INDEX_FILE = "phash_index.json"
+VARIANT_WIDTHS = ()      # e.g. (200, 400, 800, 1600): WebP + JPEG sizes under each product folder (() = off)
+VARIANTS_MANIFEST = "image_variants.json"
+BLOB_STORE = None   # e.g. "prosmart_store": identical images hard-linked to one copy (None = off)
+
+MANIFEST_FILE = "crawl_manifest.sqlite"
+CRAWL_SELECT = "pending"    # see crawl_manifest.py; override with: python json_img_crawler.py lt:5
+
+DOWNLOAD_CONCURRENCY = 32   # parallel image downloads across all hosts
+DOWNLOAD_PER_HOST = 8       # parallel image downloads per host
+MAX_DOWNLOAD_MB = 15        # abort any single download bigger than this
+MAX_IMAGE_MEGAPIXELS = 40   # abort any download whose header declares more pixels (decode bombs)
+SPOOL_OVER_MB = 1           # bodies bigger than this stream to a temp file instead of memory
+
+BROWSER_WORKERS = 4         # products crawled in parallel, one Chrome each
+RESTART_AFTER_PAGES = 50    # recycle each Chrome after this many page loads
+PAGE_READY_TIMEOUT = 8      # max seconds to wait for the gallery / og:image to appear
+HOST_RATE = 8               # starting requests/sec per host; adapts to 429/503/latency
+
+METRICS_FILE = "crawl_metrics.json"   # per-stage timings + counters written after each run (None = off)
+PROGRESS_EVERY = 0                    # seconds between "📈 progress / ETA" lines (0 = off)
+
+HTTP_CACHE_DIR = ".http_cache"   # image bytes + page HTML reused across runs (None = off)
+HTTP_CACHE_MAX_MB = 2048         # least-recently-used entries are evicted beyond this
+CACHE_ONLY = False               # replay purely from the cache, never touch the network
 
 HEADERS = {
     "User-Agent": (
@@ -34,14 +56,8 @@ HEADERS = {
 
 # ============ SELENIUM ============
 
-chrome_opts = Options()
-chrome_opts.add_argument("--headless=new")
-chrome_opts.add_argument("--disable-gpu")
-chrome_opts.add_argument("--no-sandbox")
-chrome_opts.add_argument("--disable-dev-shm-usage")
-
-service = Service(ChromeDriverManager().install())
-driver = webdriver.Chrome(service=service, options=chrome_opts)
+# browsers, downloader, image workers, catalog ...; built by session.start() in main()
+session = CrawlSession(sys.modules[__name__], BROWSER_WORKERS)
 
 
 # ============ HELPERS ============
@@ -54,71 +70,32 @@ def clean(name: str):
     return s.strip().replace(" ", "_")
 
 
-def download_bytes(url):
-    try:
-        r = requests.get(url, headers=HEADERS, timeout=12)
-        if r.status_code == 200:
-            return r.content
-    except:
-        pass
-    return None
-
-
-def is_valid_image(img: Image.Image):
-    """Basic quality checks."""
-    w, h = img.size
-    if w < MIN_WIDTH or h < MIN_HEIGHT:
-        return False
-
-    gray = img.convert("L")
-    bright_pixels = sum(1 for px in gray.getdata() if px > 245)
-    total = w * h
-
-    if (total - bright_pixels) / total < MIN_NON_WHITE_RATIO:
-        return False
-
-    return True
-
-
-def img_hash(content):
-    try:
-        img = Image.open(BytesIO(content)).convert("L").resize((256, 256))
-        return str(imagehash.phash(img))
-    except:
-        return None
-
-
-def save_image(content, path):
-    try:
-        img = Image.open(BytesIO(content)).convert("RGB")
-        img.save(path, format="JPEG", quality=90)
-    except:
-        pass
+# Basic quality checks (a picklable callable: it also runs in the cpu_pool workers)
+is_valid_image = QualityCheck(MIN_WIDTH, MIN_HEIGHT, MIN_NON_WHITE_RATIO, fast=FAST_VALIDITY_CHECK)
 
 
 # ============ AMAZON SCRAPING ============
 
 def extract_amazon_images(page_source):
-    soup = BeautifulSoup(page_source, "html.parser")
-    urls = set()
+    urls = []
 
-    main = soup.select_one("#imgTagWrapperId img")
+    main = main_gallery_img(page_source)
     if main:
         dyn = main.get("data-a-dynamic-image")
         if dyn:
             try:
                 dyn_json = json.loads(dyn)
-                urls.update(dyn_json.keys())
+                urls.extend(dyn_json.keys())
             except:
                 pass
         if main.get("src"):
-            urls.add(main["src"])
+            urls.append(main["src"])
 
-    for img in soup.find_all("img"):
+    for img in iter_img_attrs(page_source):
         for attr in ("data-old-hires", "src", "data-src"):
             u = img.get(attr)
             if u and u.startswith("http"):
-                urls.add(u)
+                urls.append(u)
 
     cleaned = []
     for u in urls:
@@ -127,7 +104,7 @@ def extract_amazon_images(page_source):
             u = "https:" + u
         cleaned.append(u)
 
-    return cleaned
+    return list(dict.fromkeys(cleaned))  # dedupe, keep page order
 
 
 # ============ GENERIC PAGE IMAGE SCRAPER ============
@@ -137,17 +114,14 @@ def scrape_all_images_from_page(url):
     print(f"  🌐 Scraping fallback page: {url}")
 
     try:
-        driver.get(url)
-        time.sleep(1.2)
+        page = session.browsers.get_page(url)
     except:
         print("  ❌ Failed to load fallback page.")
         return []
 
-    soup = BeautifulSoup(driver.page_source, "html.parser")
-
-    urls = set()
+    urls = {}
 
-    for img in soup.find_all("img"):
+    for img in iter_img_attrs(page):
         src = img.get("src") or img.get("data-src") or img.get("data-lazy-src")
         if not src:
             continue
@@ -159,7 +133,7 @@ def scrape_all_images_from_page(url):
             src = urljoin(url, src)
 
         if src.startswith("http"):
-            urls.add(src)
+            urls[src] = None
 
     cleaned = list(urls)
     print(f"  🌟 Found {len(cleaned)} fallback images")
@@ -169,104 +143,54 @@ def scrape_all_images_from_page(url):
 
 # ============ MAIN PRODUCT PROCESSOR ============
 
-def process_product(prod, category_name, subcategory_name):
-    pid = prod["product_id"]
-    pname = clean(prod["product_name"])
-
+def product_folder(pid, category_name, subcategory_name):
     # FOLDER: category/subcategory/product_id/
-    folder = os.path.join(
+    return os.path.join(
         OUTPUT_ROOT,
         clean(category_name),
         clean(subcategory_name),
         str(pid)
     )
 
-    os.makedirs(folder, exist_ok=True)
-
-    seen = set()
-    count = 0
 
-    print(f"\n▶ Processing: {pid} ({pname})")
-
-    # ========== PRIMARY SOURCE LOOP ==========
-
-    for url in prod.get("image_urls", []):
-        if count >= MAX_IMAGES_PER_PRODUCT:
-            break
-
-        if "amazon." in url:
-            print("  🛒 Amazon URL → scraping full gallery...")
-            try:
-                driver.get(url)
-                time.sleep(1.5)
-                imgs = extract_amazon_images(driver.page_source)
-            except:
-                imgs = []
-        else:
-            imgs = [url]  # direct non-Amazon image link
+def process_product(prod, category_name, subcategory_name):
+    pid = prod["product_id"]
+    pname = clean(prod["product_name"])
 
-        for img_url in imgs:
-            if count >= MAX_IMAGES_PER_PRODUCT:
-                break
+    folder = product_folder(pid, category_name, subcategory_name)
 
-            if not img_url:
-                continue
+    os.makedirs(folder, exist_ok=True)
 
-            content = download_bytes(img_url)
-            if not content:
-                continue
+    # this folder is being re-crawled: its old hashes must not block its new images
+    session.catalog.forget_prefix(folder)
 
-            try:
-                img = Image.open(BytesIO(content))
-            except:
-                continue
+    def image_path(n):
+        return os.path.join(folder, f"{pid}_img{n}.jpg")
 
-            if not is_valid_image(img):
-                continue
-
-            h = img_hash(content)
-            if not h or h in seen:
-                continue
+    print(f"\n▶ Processing: {pid} ({pname})")
 
-            seen.add(h)
+    # ========== PRIMARY SOURCES ==========
 
-            count += 1
-            save_image(content, os.path.join(folder, f"{pid}_img{count}.jpg"))
+    tried, saved = session.pipeline.run(
+        session.discover_images(prod, extract_amazon_images), image_path,
+        MAX_IMAGES_PER_PRODUCT, validate=is_valid_image,
+    )
 
     # ========== FALLBACK IF NO IMAGES FOUND ==========
 
-    if count == 0:
+    if not saved:
         print("  ⚠ No images found → FALLBACK TO PAGE SCRAPING!")
 
         fallback_url = prod["image_urls"][0] if prod["image_urls"] else None
         if fallback_url:
-            fallback_imgs = scrape_all_images_from_page(fallback_url)
-
-            for img_url in fallback_imgs:
-                if count >= MAX_IMAGES_PER_PRODUCT:
-                    break
-
-                content = download_bytes(img_url)
-                if not content:
-                    continue
-
-                try:
-                    img = Image.open(BytesIO(content))
-                except:
-                    continue
+            more_tried, saved = session.pipeline.run(
+                scrape_all_images_from_page(fallback_url), image_path,
+                MAX_IMAGES_PER_PRODUCT, validate=is_valid_image,
+            )
+            tried += more_tried
 
-                if not is_valid_image(img):
-                    continue
-
-                h = img_hash(content)
-                if not h or h in seen:
-                    continue
-
-                seen.add(h)
-                count += 1
-                save_image(content, os.path.join(folder, f"{pid}_img{count}.jpg"))
-
-    print(f"  ✔ Saved {count} images")
+    print(f"  ✔ Saved {len(saved)} images")
+    return tried, saved
 
 
 # ============ MAIN ============
@@ -275,12 +199,12 @@ def main():
     with open(INPUT_JSON, "r", encoding="utf-8") as f:
         data = json.load(f)
 
-    for cat_name, cat_data in data["categories"].items():
-        for sub_name, sub_data in cat_data["subcategories"].items():
-            for prod in sub_data["products"]:
-                process_product(prod, cat_name, sub_name)
-
-    driver.quit()
+    session.start()
+    try:
+        selector = sys.argv[1] if len(sys.argv) > 1 else CRAWL_SELECT
+        session.crawl_products(data, selector, process_product, product_folder)
+    finally:
+        session.close()     # Chrome quit and catalog saved even after Ctrl-C
     print("\n🎉 All images downloaded successfully!")
 
 
@@ -0,0 +1,116 @@
+import json
+import random
+
+
+# =====================================================
+#           SYNTHETIC PRODUCT PAGE FIXTURES
+# =====================================================
+#
+# Stand-ins for saved Amazon / generic product pages, shaped like the real
+# thing where the crawlers look: nav sprites and icons, an #imgTagWrapperId
+# main image with data-a-dynamic-image, thumbnail strips with size-modified
+# variants, colorImages / imageGalleryData script blobs and an og:image meta,
+# all buried in a few MB of unrelated markup and inline JS.
+
+AMAZON_MEDIA = "https://m.media-amazon.com"
+
+
+def _asset_ids(rng, n):
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+    return ["".join(rng.choice(alphabet) for _ in range(9)) + "L" for _ in range(n)]
+
+
+def _filler(rng, kb):
+    """Unrelated markup + inline script noise, roughly `kb` kilobytes."""
+    blocks = []
+    size = 0
+    while size < kb * 1024:
+        if rng.random() < 0.4:
+            js = ";".join(f"var v{rng.randrange(10**6)}={rng.randrange(10**9)}" for _ in range(60))
+            block = f"<script type=\"text/javascript\">{js}</script>\n"
+        else:
+            cells = "".join(
+                f"<td class=\"a-span{rng.randrange(12)}\"><span>{rng.randrange(10**6)}</span></td>"
+                for _ in range(20)
+            )
+            block = f"<div class=\"a-section\"><table><tr>{cells}</tr></table></div>\n"
+        blocks.append(block)
+        size += len(block)
+    return "".join(blocks)
+
+
+def amazon_product_page(n_images=12, filler_kb=2048, media_base=AMAZON_MEDIA, seed=0):
+    """An Amazon-style product page with `n_images` gallery assets."""
+    rng = random.Random(seed)
+    assets = _asset_ids(rng, n_images)
+
+    def media(asset, variant=""):
+        return f"{media_base}/images/I/{asset}{variant}.jpg"
+
+    nav = "".join(
+        f"<img src=\"{media_base}/images/G/01/nav/sprite{i}._CB{rng.randrange(10**8)}_.png\" alt=\"\">"
+        for i in range(15)
+    )
+
+    dynamic = {
+        media(assets[0], variant): [size, size]
+        for variant, size in (("._AC_SX679_", 679), ("._AC_SY879_", 879), ("._AC_SL1500_", 1500))
+    }
+    main = (
+        "<div id=\"imgTagWrapperId\" class=\"imgTagWrapper\">"
+        f"<img alt=\"Product\" src=\"{media(assets[0], '._AC_SX679_')}\" "
+        f"data-old-hires=\"{media(assets[0], '._AC_SL1500_')}\" "
+        f"data-a-dynamic-image='{json.dumps(dynamic)}'></div>"
+    )
+
+    thumbs = "".join(
+        f"<li class=\"imageThumbnail\"><img src=\"{media(a, '._SS40_')}\" "
+        f"data-src=\"{media(a, '._AC_SX300_')}\"></li>"
+        for a in assets
+    )
+
+    color_images = [
+        {
+            "hiRes": media(a, "._AC_SL1500_"),
+            "thumb": media(a, "._SS40_"),
+            "large": media(a, ""),
+            "main": {media(a, "._AC_SX679_"): [679, 679], media(a, "._AC_SX425_"): [425, 425]},
+            "variant": "MAIN" if i == 0 else f"PT0{i}",
+        }
+        for i, a in enumerate(assets)
+    ]
+    gallery = [{"mainUrl": media(a, "._AC_SL1500_"), "thumbUrl": media(a, "._SS40_")} for a in assets]
+
+    scripts = (
+        "<script type=\"text/javascript\">P.when('A').register(\"ImageBlockATF\", function(A){"
+        f"var data = {{'colorImages': {{ 'initial': {json.dumps(color_images)} }},"
+        "'colorToAsin': {'initial': {}}, 'heroImage': {}};"
+        "A.trigger('P.AboveTheFold'); return data;});</script>"
+        "<script type=\"a-state\" data-a-state='{\"key\":\"gallery\"}'>"
+        f"{{\"imageGalleryData\" : {json.dumps(gallery)}, \"centerColMargin\" : 12}}</script>"
+    )
+
+    half = filler_kb // 2
+    return (
+        "<!doctype html><html><head><title>Product</title>"
+        f"<meta property=\"og:image\" content=\"{media(assets[0], '._AC_SL1500_')}\">"
+        "</head><body>"
+        f"<header>{nav}</header>{_filler(rng, half)}"
+        f"<div id=\"leftCol\">{main}<ul>{thumbs}</ul></div>{scripts}"
+        f"{_filler(rng, filler_kb - half)}</body></html>"
+    )
+
+
+def generic_product_page(image_urls, filler_kb=256, seed=0):
+    """A non-Amazon shop page: og:image + plain/lazy <img> tags with size hints."""
+    rng = random.Random(seed)
+    imgs = "".join(
+        f"<img src=\"{u}\" width=\"{rng.choice([300, 600, 800])}\" height=\"{rng.choice([300, 600])}\">"
+        if i % 2 == 0 else f"<img data-src=\"{u}\" class=\"lazy\">"
+        for i, u in enumerate(image_urls)
+    )
+    og = f"<meta property=\"og:image\" content=\"{image_urls[0]}\">" if image_urls else ""
+    return (
+        f"<!doctype html><html><head>{og}</head><body>"
+        f"{_filler(rng, filler_kb)}<main>{imgs}</main></body></html>"
+    )
@@ -0,0 +1,280 @@
+"""
+Catalog-wide perceptual-hash index.
+
+Every saved image's phash is stored in a multi-index hash table, so
+"is there anything within Hamming distance d of this hash?" only checks a
+handful of bucket-mates instead of comparing against every image.
+
+Offline mode scans an existing image tree, rebuilds the index and reports
+near-duplicate clusters:
+
+    python phash_index.py [--root prosmart_images] [--distance 4]
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+
+from image_processing import DecodedImage
+from image_variants import VARIANT_DIR
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+IMAGE_ROOT = "prosmart_images"
+INDEX_FILE = "phash_index.json"
+NEAR_DUP_DISTANCE = 4     # max differing bits (out of 64) to call two images the same
+SAVE_EVERY = 30.0         # seconds between checkpoint() writes during a crawl
+VALID_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+# =====================================================
+#              MULTI-INDEX HASHING
+# =====================================================
+
+class MultiIndexHash:
+    """
+    Multi-index hashing over 64-bit hashes.
+
+    The hash is cut into `chunks` disjoint bit ranges, each with its own
+    exact-match table. By pigeonhole, two hashes within distance
+    `chunks - 1` agree exactly on at least one range, so a lookup only
+    checks the few hashes sharing a bucket instead of the whole catalog.
+    Radii beyond that fall back to a linear scan.
+    """
+
+    def __init__(self, chunks=NEAR_DUP_DISTANCE + 1, bits=64):
+        self.chunks = chunks
+        base, extra = divmod(bits, chunks)
+        self.ranges = []
+        shift = 0
+        for i in range(chunks):
+            width = base + (1 if i < extra else 0)
+            self.ranges.append((shift, (1 << width) - 1))
+            shift += width
+        self.tables = [{} for _ in range(chunks)]
+        self.values = set()
+
+    def _keys(self, h):
+        return [(h >> shift) & mask for shift, mask in self.ranges]
+
+    def add(self, h: int):
+        if h in self.values:
+            return
+        self.values.add(h)
+        for table, key in zip(self.tables, self._keys(h)):
+            table.setdefault(key, []).append(h)
+
+    def find(self, h: int, max_distance: int):
+        """All (hash, distance) pairs within max_distance of h."""
+        if max_distance >= self.chunks:
+            candidates = self.values
+        else:
+            candidates = set()
+            for table, key in zip(self.tables, self._keys(h)):
+                candidates.update(table.get(key, ()))
+
+        found = []
+        for value in candidates:
+            d = hamming(h, value)
+            if d <= max_distance:
+                found.append((value, d))
+        return found
+
+
+# =====================================================
+#                 PERSISTENT INDEX
+# =====================================================
+
+class PhashIndex:
+    """
+    phash → saved image paths, backed by multi-index hashing and a JSON file.
+
+    Paths are removed lazily: the hash stays in the tables but lookups skip
+    hashes whose path list became empty. Safe to share between crawler threads.
+    """
+
+    def __init__(self, path=INDEX_FILE, load=True):
+        self.path = path
+        self.table = MultiIndexHash()
+        self.paths = {}   # hex hash → [image paths]
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._saved_at = time.monotonic()
+
+        if load and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for h, paths in json.load(f).get("hashes", {}).items():
+                    for p in paths:
+                        self._add(h, p)
+
+    def _add(self, h, image_path):
+        if h not in self.paths:
+            self.paths[h] = []
+            self.table.add(int(h, 16))
+        if image_path not in self.paths[h]:
+            self.paths[h].append(image_path)
+
+    def _find(self, h, max_distance):
+        matches = []
+        for value, d in self.table.find(int(h, 16), max_distance):
+            paths = self.paths.get(f"{value:016x}")
+            if paths:
+                matches.append((d, paths))
+        matches.sort(key=lambda m: m[0])
+        return matches
+
+    def find(self, h, max_distance=NEAR_DUP_DISTANCE):
+        """[(distance, [paths])] for every indexed hash within max_distance, nearest first."""
+        with self._lock:
+            return self._find(h, max_distance)
+
+    def claim(self, h, image_path, max_distance=NEAR_DUP_DISTANCE, scope=None):
+        """
+        Atomically check-and-insert. Only images under the `scope` folder
+        (default: image_path's own folder) can reject h: products may share
+        a photo with each other, just not show it twice themselves.
+
+        Returns (duplicate, shared): `duplicate` is the path of a near
+        duplicate within scope (and nothing is added), else None after
+        indexing h → image_path, with `shared` listing near duplicates
+        saved by other products.
+        """
+        scope = os.path.join(scope or os.path.dirname(image_path), "")
+        with self._lock:
+            shared = []
+            for _, paths in self._find(h, max_distance):
+                for p in paths:
+                    if p.startswith(scope):
+                        return p, []
+                    shared.append(p)
+            self._add(h, image_path)
+            return None, shared
+
+    def discard(self, h, image_path):
+        """Undo a claim (e.g. the image could not be written)."""
+        with self._lock:
+            paths = self.paths.get(h)
+            if paths and image_path in paths:
+                paths.remove(image_path)
+
+    def forget_prefix(self, prefix):
+        """Drop every entry stored under `prefix` (e.g. a product folder being re-crawled)."""
+        prefix = os.path.join(prefix, "")
+        with self._lock:
+            for h, paths in self.paths.items():
+                paths[:] = [p for p in paths if not p.startswith(prefix)]
+
+    def save(self):
+        """Write the index: a snapshot taken under the lock, so crawler threads may keep claiming."""
+        with self._save_lock:
+            with self._lock:
+                data = {"hashes": {h: list(p) for h, p in sorted(self.paths.items()) if p}}
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+            self._saved_at = time.monotonic()
+
+    def checkpoint(self, every=SAVE_EVERY):
+        """
+        save() if the last one is more than `every` seconds old. Cheap to call
+        after each product: the whole file is rewritten at most that often.
+        """
+        with self._lock:
+            if time.monotonic() - self._saved_at < every:
+                return False
+            self._saved_at = time.monotonic()   # this thread saves, the others skip
+        self.save()
+        return True
+
+
+# =====================================================
+#                OFFLINE SCAN + REPORT
+# =====================================================
+
+def iter_images(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        # resized copies (image_variants) are not catalog images
+        dirnames[:] = sorted(d for d in dirnames if d != VARIANT_DIR)
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in VALID_EXT:
+                yield os.path.join(dirpath, filename)
+
+
+def build_index(root, index_path=INDEX_FILE):
+    """Hash every image under root into a fresh index."""
+    index = PhashIndex(index_path, load=False)
+    for image_path in iter_images(root):
+        try:
+            with open(image_path, "rb") as f:
+                img = DecodedImage(f.read())
+        except Exception:
+            print(f"  ⚠ Could not decode {image_path}")
+            continue
+        h = img.phash()
+        img.release()
+        if h:
+            index._add(h, image_path)
+    return index
+
+
+def duplicate_clusters(index, max_distance=NEAR_DUP_DISTANCE):
+    """Group hashes that are within max_distance of each other (single linkage)."""
+    parent = {h: h for h, paths in index.paths.items() if paths}
+
+    def root_of(h):
+        while parent[h] != h:
+            parent[h] = parent[parent[h]]
+            h = parent[h]
+        return h
+
+    for h in parent:
+        for value, _ in index.table.find(int(h, 16), max_distance):
+            other = f"{value:016x}"
+            if other in parent:
+                parent[root_of(other)] = root_of(h)
+
+    groups = {}
+    for h in parent:
+        groups.setdefault(root_of(h), []).extend(index.paths[h])
+
+    return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=len, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the phash index and report near-duplicates.")
+    parser.add_argument("--root", default=IMAGE_ROOT)
+    parser.add_argument("--index", default=INDEX_FILE)
+    parser.add_argument("--distance", type=int, default=NEAR_DUP_DISTANCE)
+    args = parser.parse_args()
+
+    print(f"🔍 Hashing images under {args.root} ...")
+    index = build_index(args.root, args.index)
+    total = sum(len(p) for p in index.paths.values())
+    print(f"  {total} images, {len(index.paths)} distinct hashes")
+
+    clusters = duplicate_clusters(index, args.distance)
+    products = lambda cluster: sorted({os.path.basename(os.path.dirname(p)) for p in cluster})
+
+    print(f"\n♻ {len(clusters)} duplicate clusters (distance ≤ {args.distance}), "
+          f"{sum(len(c) - 1 for c in clusters)} redundant images\n")
+    for cluster in clusters:
+        print(f"  [{len(cluster)} images across {', '.join(products(cluster))}]")
+        for p in cluster:
+            print(f"     {p}")
+
+    index.save()
+    print(f"\n📁 Index saved to: {args.index}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlparse
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+INITIAL_RATE = 8.0         # requests/sec a host starts at
+MIN_RATE = 0.5             # never slow a host below this
+MAX_RATE = 50.0            # never speed a host above this
+BURST = 8                  # requests a quiet host may send back to back
+
+RATE_STEP = 0.5            # additive increase per fast successful response
+THROTTLE_FACTOR = 0.5      # multiplicative decrease on 429 / 503 / connection errors
+SLOW_FACTOR = 0.85         # gentler decrease when a response is merely slow
+SLOW_LATENCY = 3.0         # seconds to first byte considered "slow"
+CUT_COOLDOWN = 1.0         # at most one decrease per host per this many seconds
+
+THROTTLE_STATUSES = {429, 503}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5         # seconds, doubled per attempt
+BACKOFF_CAP = 10.0
+URL_DEADLINE = 45.0        # total seconds one URL may take, retries included
+
+
+def backoff(attempt):
+    """Full-jitter exponential backoff for retry number `attempt` (1, 2, ...)."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def retry_after_seconds(value):
+    """Retry-After header → seconds (only the delta-seconds form is used)."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# =====================================================
+#              PER-HOST TOKEN BUCKETS
+# =====================================================
+
+class HostBucket:
+    """Token bucket for one host; `rate` is adjusted AIMD-style."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = float(BURST)
+        self.last = time.monotonic()
+        self.blocked_until = 0.0
+        self.last_cut = 0.0
+
+    def reserve(self, now, max_wait=None):
+        """
+        Take one token (possibly going into debt), return seconds to wait.
+        If that would be longer than `max_wait`, take nothing and return None.
+        """
+        self.tokens = min(BURST, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= 1
+        debt = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        delay = max(debt, self.blocked_until - now)
+        if max_wait is not None and delay > max_wait:
+            self.tokens += 1
+            return None
+        return delay
+
+    def cut(self, now, factor, min_rate):
+        """Multiplicative decrease, once per CUT_COOLDOWN: a burst of failures
+        from a single overload episode only counts once."""
+        if now - self.last_cut < CUT_COOLDOWN:
+            return False
+        self.last_cut = now
+        self.rate = max(min_rate, self.rate * factor)
+        return True
+
+
+class RateLimiter:
+    """
+    Per-host request pacing shared by the HTTP downloader (asyncio loop
+    thread) and the Selenium page loads (pool threads).
+
+    Before each request call `wait(url)` / `await wait_async(url)`
+    (both return False when the wait would blow the caller's deadline);
+    afterwards report the outcome with `record(url, status, latency)`.
+    429/503 and connection failures halve the host's rate (honouring
+    Retry-After), slow answers shave it a little, fast successes add
+    RATE_STEP back.
+    """
+
+    def __init__(self, initial_rate=INITIAL_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.stats = Counter()      # requests / delayed / wait_seconds / throttled / slow / retries / gave_up
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, url):
+        host = urlparse(url).netloc.lower()
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = HostBucket(self.initial_rate)
+        return bucket
+
+    def reserve(self, url, max_wait=None):
+        """Seconds to wait before sending a request to url's host (None: longer than max_wait)."""
+        with self._lock:
+            delay = self._bucket(url).reserve(time.monotonic(), max_wait)
+            if delay is None:
+                return None
+            self.stats["requests"] += 1
+            if delay > 0:
+                self.stats["delayed"] += 1
+                self.stats["wait_seconds"] += delay
+        return delay
+
+    def wait(self, url, max_wait=None):
+        delay = self.reserve(url, max_wait)
+        if delay is None:
+            return False
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    async def wait_async(self, url, max_wait=None):
+        delay = self.reserve(url, max_wait)
+        if delay is None:
+            return False
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return True
+
+    def record(self, url, status, latency, retry_after=None):
+        """
+        Feed back one response. `status=None` means the request failed
+        without a response (timeout, reset, DNS ...).
+        """
+        with self._lock:
+            bucket = self._bucket(url)
+            now = time.monotonic()
+            if status is None or status in THROTTLE_STATUSES:
+                self.stats["throttled"] += 1
+                bucket.cut(now, THROTTLE_FACTOR, self.min_rate)
+                pause = retry_after_seconds(retry_after)
+                if pause:
+                    bucket.blocked_until = max(bucket.blocked_until, now + pause)
+            elif latency > SLOW_LATENCY:
+                self.stats["slow"] += 1
+                bucket.cut(now, SLOW_FACTOR, self.min_rate)
+            elif status < 500:
+                bucket.rate = min(self.max_rate, bucket.rate + RATE_STEP)
+
+    def count(self, name, n=1):
+        """Bump one of `stats` (retries, gave_up ...) from any thread."""
+        with self._lock:
+            self.stats[name] += n
+
+    def rates(self):
+        """{host: current requests/sec}"""
+        with self._lock:
+            return {host: b.rate for host, b in self._buckets.items()}
+
+    def report(self):
+        s = self.stats
+        slowest = sorted(self.rates().items(), key=lambda kv: kv[1])[:3]
+        hosts = ", ".join(f"{h} {r:.1f}/s" for h, r in slowest)
+        return (f"{s['requests']} requests, {s['retries']} retries, {s['gave_up']} gave up, "
+                f"{s['throttled']} throttled, {s['slow']} slow, "
+                f"{s['delayed']} delayed ({s['wait_seconds']:.1f}s)"
+                + (f"; slowest hosts: {hosts}" if hosts else ""))
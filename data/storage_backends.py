@@ -0,0 +1,220 @@
+import os
+import random
+import shutil
+import threading
+import time
+from collections import Counter
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+LOCAL_ROOT = "static_images"          # LocalBackend: directory served by nginx / a CDN origin
+LOCAL_BASE_URL = "/static_images/"    # ... and the URL prefix it is served under
+
+SIM_LATENCY = 0.25        # SimulatedBackend: mean seconds per call
+SIM_JITTER = 0.5          # ± fraction of the latency, uniform
+SIM_FAILURE_RATE = 0.02   # fraction of calls answered with a transient 500
+SIM_RATE_LIMIT = 20.0     # calls/sec the fake API accepts before answering 429 (0 = unlimited)
+SIM_BURST = 10            # calls it lets through back to back
+
+
+# =====================================================
+#                   ERRORS
+# =====================================================
+#
+# Backends translate their own failures into these two, so the retry loop
+# in cloudinary_upload only has to know "try again" or "give up".
+
+class TransientError(Exception):
+    """Worth retrying: rate limited, 5xx, network trouble. `status` as HTTP."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class PermanentError(Exception):
+    """Retrying will not help: bad file, bad credentials, forbidden."""
+
+
+# =====================================================
+#                   BACKENDS
+# =====================================================
+#
+# upload(local_path, public_id) → public URL; delete(public_id).
+# public_id is the image's path under the image root without extension.
+# `rate_limited` says whether uploads should go through the RateLimiter.
+
+class CloudinaryBackend:
+    """The real thing: cloudinary.uploader with the account set up by cloudinary.config()."""
+
+    name = "cloudinary"
+    rate_limited = True
+
+    def __init__(self):
+        import cloudinary.exceptions
+        import cloudinary.uploader
+
+        self.uploader = cloudinary.uploader
+        errors = cloudinary.exceptions
+        self.permanent = (errors.BadRequest, errors.AuthorizationRequired, errors.NotAllowed,
+                          errors.NotFound, errors.AlreadyExists)
+        self.rate_limited_error = errors.RateLimited
+        self.server_error = errors.GeneralError
+
+    def _translate(self, e):
+        if isinstance(e, self.permanent):
+            return PermanentError(str(e))
+        if isinstance(e, self.rate_limited_error):
+            return TransientError(str(e), 429)
+        if isinstance(e, self.server_error):
+            return TransientError(str(e), 500)
+        return TransientError(str(e))      # socket / unparseable response
+
+    def upload(self, local_path, public_id):
+        try:
+            result = self.uploader.upload(
+                local_path,
+                public_id=public_id,
+                overwrite=True,
+                resource_type="image"
+            )
+        except Exception as e:
+            raise self._translate(e) from e
+        return result.get("secure_url")
+
+    def delete(self, public_id):
+        try:
+            self.uploader.destroy(public_id, resource_type="image", invalidate=True)
+        except Exception as e:
+            raise self._translate(e) from e
+
+
+class LocalBackend:
+    """
+    Self-hosted alternative: copy (hard link when possible) each image into
+    a static directory that a web server or CDN serves at base_url.
+    """
+
+    name = "local"
+    rate_limited = False
+
+    def __init__(self, root=LOCAL_ROOT, base_url=LOCAL_BASE_URL):
+        self.root = root
+        self.base_url = base_url
+
+    def _target(self, public_id, ext=None):
+        if ext is None:    # delete: find whatever extension it was stored with
+            folder, stem = os.path.split(os.path.join(self.root, public_id))
+            try:
+                names = [n for n in os.listdir(folder) if os.path.splitext(n)[0] == stem]
+            except OSError:
+                return None
+            return os.path.join(folder, names[0]) if names else None
+        return os.path.join(self.root, public_id + ext)
+
+    def upload(self, local_path, public_id):
+        ext = os.path.splitext(local_path)[1].lower()
+        target = self._target(public_id, ext)
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.{threading.get_ident()}.tmp"
+            try:
+                os.link(local_path, tmp)
+            except OSError:
+                shutil.copyfile(local_path, tmp)
+            os.replace(tmp, target)
+        except FileNotFoundError as e:
+            raise PermanentError(str(e)) from e
+        except OSError as e:
+            raise TransientError(str(e)) from e
+        return self.base_url + public_id + ext
+
+    def delete(self, public_id):
+        target = self._target(public_id)
+        if target is None:
+            return
+        os.remove(target)
+        folder = os.path.dirname(target)
+        while os.path.abspath(folder) != os.path.abspath(self.root):    # drop emptied product folders
+            try:
+                os.rmdir(folder)
+            except OSError:
+                break
+            folder = os.path.dirname(folder)
+
+
+class SimulatedBackend:
+    """
+    A remote that only pretends: sleeps for `latency` (± jitter), fails
+    `failure_rate` of the calls with a 500 and answers 429 once calls
+    arrive faster than `rate_limit`/sec. Stores nothing. For benchmarking
+    worker counts and retry settings offline (bench_upload.py).
+    """
+
+    name = "simulated"
+    rate_limited = True
+
+    def __init__(self, latency=SIM_LATENCY, jitter=SIM_JITTER, failure_rate=SIM_FAILURE_RATE,
+                 rate_limit=SIM_RATE_LIMIT, burst=SIM_BURST, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.stats = Counter()     # calls / ok / failed / throttled
+        self._random = random.Random(seed)
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _call(self):
+        with self._lock:
+            self.stats["calls"] += 1
+            throttled = False
+            if self.rate_limit:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate_limit)
+                self._last = now
+                throttled = self._tokens < 1
+                if not throttled:
+                    self._tokens -= 1
+            failed = self._random.random() < self.failure_rate
+            delay = self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+
+        if throttled:
+            self._count("throttled")
+            time.sleep(delay / 10)             # refused fast, like a real 429
+            raise TransientError("simulated 429 Too Many Requests", 429)
+        time.sleep(delay)
+        if failed:
+            self._count("failed")
+            raise TransientError("simulated 500 Internal Server Error", 500)
+        self._count("ok")
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def upload(self, local_path, public_id):
+        if not os.path.exists(local_path):
+            raise PermanentError(f"no such file: {local_path}")
+        self._call()
+        ext = os.path.splitext(local_path)[1].lower()
+        return f"https://simulated.invalid/{public_id}{ext}"
+
+    def delete(self, public_id):
+        self._call()
+
+
+BACKENDS = {b.name: b for b in (CloudinaryBackend, LocalBackend, SimulatedBackend)}
+
+
+def make_backend(name, **options):
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"unknown storage backend {name!r} (choose from {', '.join(BACKENDS)})") from None
+    return cls(**options)
@@ -0,0 +1,37 @@
+from amazon_urls import canonicalize_amazon_urls, parse_amazon_media
+
+MEDIA = "https://m.media-amazon.com/images"
+
+
+def test_size_variants_collapse_to_largest():
+    urls = [
+        f"{MEDIA}/I/71abcXYZ12L._SS40_.jpg",
+        f"{MEDIA}/I/71abcXYZ12L._AC_SX679_.jpg",
+        f"{MEDIA}/I/81defUVW34L._AC_SX300_.jpg",
+    ]
+    assert canonicalize_amazon_urls(urls) == [
+        f"{MEDIA}/I/71abcXYZ12L._AC_SX679_.jpg",
+        f"{MEDIA}/I/81defUVW34L._AC_SX300_.jpg",
+    ]
+
+
+def test_original_beats_any_size():
+    assert parse_amazon_media(f"{MEDIA}/I/71abcXYZ12L.jpg")[2] > parse_amazon_media(
+        f"{MEDIA}/I/71abcXYZ12L._SL1500_.jpg")[2]
+
+
+def test_aplus_media_is_kept():
+    aplus = f"{MEDIA}/S/aplus-media-library-service-media/0f1e2d3c-aaaa-bbbb-cccc-1234567890ab.__CR0,0,970,600_PT0_SX970_V1___.jpg"
+    urls = [f"{MEDIA}/I/71abcXYZ12L._AC_SX679_.jpg", aplus, aplus]
+    assert canonicalize_amazon_urls(urls) == [f"{MEDIA}/I/71abcXYZ12L._AC_SX679_.jpg", aplus]
+
+
+def test_page_chrome_is_dropped():
+    urls = [
+        f"{MEDIA}/G/01/nav/sprite1._CB485933.png",
+        f"{MEDIA}/G/31/x-locale/common/transparent-pixel.gif",
+        f"{MEDIA}/S/sash/McBZv0ZvnbehkIx.woff2.png",
+        f"{MEDIA}/S/amazon-avatars-global/default-icon._CR0,0,1024,1024_SX48_.png",
+        "https://example.com/product.jpg",
+    ]
+    assert canonicalize_amazon_urls(urls) == ["https://example.com/product.jpg"]
@@ -0,0 +1,39 @@
+import os
+
+from http_cache import HttpCache
+
+
+def blob_files(root):
+    return [name for _, _, names in os.walk(os.path.join(root, "blobs")) for name in names]
+
+
+def test_restore_drops_previous_body(tmp_path):
+    cache = HttpCache(str(tmp_path), max_bytes=10 * 1024 ** 2)
+    for n in range(5):
+        cache.store_text("https://example.com/p", f"<html>render {n}</html>" * 1000)
+
+    assert len(blob_files(tmp_path)) == 1
+    assert cache.read_text("https://example.com/p").startswith("<html>render 4")
+    cache.close()
+
+
+def test_shared_body_kept_while_referenced(tmp_path):
+    cache = HttpCache(str(tmp_path), max_bytes=10 * 1024 ** 2)
+    cache.store("https://a.example.com/x.jpg", b"same body")
+    cache.store("https://b.example.com/x.jpg", b"same body")
+    cache.store("https://a.example.com/x.jpg", b"new body")
+
+    assert len(blob_files(tmp_path)) == 2
+    assert cache.read("https://b.example.com/x.jpg") == b"same body"
+    cache.close()
+
+
+def test_total_stays_under_budget(tmp_path):
+    cache = HttpCache(str(tmp_path), max_bytes=50_000)
+    for n in range(20):
+        cache.store_text(f"https://example.com/p{n % 2}", f"{n:02d}" * 5_000)
+
+    on_disk = sum(os.path.getsize(os.path.join(d, f))
+                  for d, _, names in os.walk(os.path.join(tmp_path, "blobs")) for f in names)
+    assert on_disk <= 50_000
+    cache.close()
@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+import time
+
+
+# =====================================================
+#                   CONFIG
+# =====================================================
+
+FSYNC_EVERY = 32          # records between fsyncs
+FSYNC_SECONDS = 1.0       # ... or this many seconds, whichever comes first
+
+
+# =====================================================
+#               APPEND-ONLY UPLOAD JOURNAL
+# =====================================================
+#
+# One JSON line per finished upload / delete, written the moment it
+# happens. Every line is flushed to the OS at once (a killed process loses
+# nothing); fsync is batched, so a power cut loses at most the last
+# FSYNC_EVERY records / FSYNC_SECONDS. A torn last line is skipped on
+# replay. compact() folds the journal into the state file and empties it.
+
+class UploadJournal:
+    """Thread-safe JSON Lines journal of {"public_id": ..., ...} records."""
+
+    def __init__(self, path, fsync_every=FSYNC_EVERY, fsync_seconds=FSYNC_SECONDS):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_seconds = fsync_seconds
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        self._pending = 0
+        self._synced = time.monotonic()
+
+    def append(self, record):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._pending += 1
+            if (self._pending >= self.fsync_every
+                    or time.monotonic() - self._synced >= self.fsync_seconds):
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._synced = time.monotonic()
+
+    def truncate(self):
+        """Empty the journal (its records are safely in the state file)."""
+        with self._lock:
+            self._file.truncate(0)
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            if self._pending:
+                self._sync()
+            self._file.close()
+
+
+def replay(path):
+    """Records of a journal file, oldest first; a torn last line is ignored."""
+    try:
+        f = open(path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue       # crash in the middle of a write
+
+
+def apply(state, record):
+    """Fold one journal record into a {public_id: entry} state dict."""
+    record = dict(record)
+    pid = record.pop("public_id")
+    if record.pop("deleted", False):
+        state.pop(pid, None)
+    else:
+        state[pid] = record
+    return state
+
+
+def compact(journal, save):
+    """
+    Fold the journal into the state file: `save()` writes the full state
+    (fsynced), then the journal, whose records it now holds, is emptied.
+    """
+    save()
+    journal.truncate()